@@ -9,6 +9,11 @@ Script simple et efficace pour imprimante thermique 57mm
 - Ajout de texte sous l'image avec --text
 - Vérification automatique du papier
 
+Codes retour (lus par le pool d'imprimantes d'app.py):
+  0 : impression terminée
+  1 : erreur (image introuvable, imprimante injoignable, envoi interrompu...)
+  2 : plus de papier, rien n'a été imprimé
+
 Usage:
   python3 script.py --image photo.jpg
   python3 script.py --image photo.jpg --hd
@@ -24,12 +29,28 @@ import sys
 import argparse
 import os
 import time
+import json
 # Supprimer TOUS les avertissements et messages
 warnings.filterwarnings("ignore")
 logging.getLogger().setLevel(logging.CRITICAL)
 
-from escpos.printer import Serial
+from escpos.printer import Serial, Dummy
 from PIL import Image, ImageEnhance
+from image_utils import open_for_width, FAST_RESAMPLE
+
+# Codes retour du script
+EXIT_ERROR = 1
+EXIT_NO_PAPER = 2
+
+class StatusSerial(Serial):
+    """Imprimante série dont la lecture d'état s'arrête au premier octet
+
+    La réponse à DLE EOT tient sur un octet : Serial._read() en demande 16 et
+    attendrait tout le timeout du port à chaque vérification du papier.
+    """
+
+    def _read(self):
+        return self.device.read(1)
 
 def parse_arguments():
     """Parser les arguments de ligne de commande"""
@@ -48,8 +69,9 @@ def parse_arguments():
 
 def connect_printer(serial_port='/dev/ttyS0', baudrate=9600):
     """Connexion à l'imprimante avec paramètres de vitesse"""
-    printer = Serial(devfile=serial_port, baudrate=baudrate, timeout=1)
-     
+    printer = StatusSerial(devfile=serial_port, baudrate=baudrate, timeout=1)
+    # Ouvrir le port maintenant : une imprimante absente échoue ici, pas en plein envoi
+    printer.open()
     return printer
 
 def check_paper_status(printer):
@@ -60,6 +82,8 @@ def check_paper_status(printer):
             
             if status == 0:
                 return False, "Plus de papier (status: 0)"
+            elif status == 1:
+                return True, "Papier bientôt fini (status: 1)"
             elif status == 2:
                 return True, "Papier présent (status: 2)"
             else:
@@ -72,10 +96,6 @@ def check_paper_status(printer):
 
 def optimize_image(img_path, high_density=False):
     """Optimiser l'image avec compensation pour la haute densité"""
-    # Charger et convertir en gris
-    img = Image.open(img_path).convert('L')
-    original_width, original_height = img.size
-    
     # Largeur maximale selon la densité
     if high_density:
         max_width = 384  # Haute densité = largeur complète
@@ -84,28 +104,38 @@ def optimize_image(img_path, high_density=False):
         max_width = 192  # Basse densité = largeur réduite
         height_compensation = 1.0  # Pas de compensation en basse densité
     
+    # Charger directement en gris, décodage JPEG réduit à la puissance de 2 la plus proche
+    img, (original_width, original_height) = open_for_width(img_path, max_width, 'L')
+    
     # Redimensionner SEULEMENT si l'image est plus large que la limite
     if original_width > max_width:
         # Calculer le ratio pour préserver les proportions
         ratio = max_width / original_width
         new_height = int(original_height * ratio * height_compensation)
-        img = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
-    elif high_density:
+        if img.size != (max_width, new_height):
+            img = img.resize((max_width, new_height), FAST_RESAMPLE)
+    elif high_density and height_compensation != 1.0:
         # Même si l'image est plus petite, appliquer la compensation en HD
         new_height = int(original_height * height_compensation)
         img = img.resize((original_width, new_height), Image.Resampling.LANCZOS)
       
     return img
 
-def print_image(printer, img, filename, high_density=False):
-    """Imprimer avec densité configurable"""
-    printer.image(
+def render_image(img, high_density=False):
+    """Convertir l'image en commandes raster ESC/POS (sans envoi)"""
+    dummy = Dummy()
+    dummy.image(
         img,
         impl='bitImageRaster',
         high_density_vertical=high_density,
         high_density_horizontal=high_density,
         fragment_height=1920
     )
+    return dummy.output
+
+def print_image(printer, raster, filename, high_density=False):
+    """Envoyer les commandes raster déjà calculées à l'imprimante"""
+    printer._raw(raster)
 
 def print_text_bottom(printer, text):
     """Imprimer du texte en bas, pleine largeur"""
@@ -126,11 +156,16 @@ def print_text_bottom(printer, text):
     printer.set(align='left')
     printer.set(bold=False)
 
-def print_with_paper_check(printer, optimized_img, filename, high_density, bottom_text):
+def print_with_paper_check(printer, raster, filename, high_density, bottom_text):
     """Imprimer avec vérification préalable du papier"""
     
-    # Procéder directement à l'impression sans vérification du papier
-    print_image(printer, optimized_img, filename, high_density)
+    # Statut inconnu (capteur absent, pas de réponse) : on imprime quand même
+    has_paper, message = check_paper_status(printer)
+    print(f"Papier: {message}")
+    if has_paper is False:
+        return False
+    
+    print_image(printer, raster, filename, high_density)
     
     # Ajouter du texte uniquement si fourni
     if bottom_text:
@@ -148,7 +183,7 @@ def main():
     image_file = args.image
     if not os.path.exists(image_file):
         print(f"Erreur: Image '{image_file}' non trouvée")
-        return
+        sys.exit(EXIT_ERROR)
     
     # Mode densité et texte
     high_density = args.hd
@@ -158,27 +193,45 @@ def main():
     printer_port = args.port
     printer_baudrate = args.baudrate
     
+    # Durées de chaque étape (ms), relues par app.py et les benchmarks
+    timings = {}
+    
     # Connexion et impression
     try:
+        start = time.perf_counter()
         printer = connect_printer(printer_port, printer_baudrate)
+        timings['connect_ms'] = (time.perf_counter() - start) * 1000
         
         # Traitement de l'image
+        start = time.perf_counter()
         optimized_img = optimize_image(image_file, high_density)
+        timings['decode_ms'] = (time.perf_counter() - start) * 1000
+        
+        # Conversion raster ESC/POS
+        start = time.perf_counter()
+        raster = render_image(optimized_img, high_density)
+        timings['raster_ms'] = (time.perf_counter() - start) * 1000
         
-        # Impression avec vérification du papier
-        success = print_with_paper_check(printer, optimized_img, 
+        # Impression avec vérification du papier (requête d'état comprise)
+        start = time.perf_counter()
+        success = print_with_paper_check(printer, raster, 
                                        os.path.basename(image_file), 
                                        high_density, bottom_text)
+        timings['transfer_ms'] = (time.perf_counter() - start) * 1000
+        print(f"TIMINGS {json.dumps(timings)}")
         
         if success:
             print("✅ Impression terminée")
             sys.exit(0)  # Succès
         else:
             print("❌ Impression annulée - Plus de papier")
-            sys.exit(2)  # Code d'erreur spécifique pour manque de papier
+            sys.exit(EXIT_NO_PAPER)  # Code d'erreur spécifique pour manque de papier
         
     except Exception as e:
         print(f"Erreur: {e}")
+        # Sur stderr aussi : le pool en fait le last_error de l'imprimante
+        print(f"Erreur: {e}", file=sys.stderr)
+        sys.exit(EXIT_ERROR)
     finally:
         try:
             printer.close()
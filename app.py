@@ -1,14 +1,16 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from flask import Flask, render_template, request, jsonify, send_from_directory, redirect, url_for, flash, Response, abort
+from flask import Flask, render_template, request, jsonify, send_from_directory, redirect, url_for, flash, Response, abort, session
+from markupsafe import Markup
 import os
 import subprocess
-import threading
 import logging
 import signal
 import atexit
 import sys
+import json
+import time
 from datetime import datetime
 from config_utils import (
     PHOTOS_FOLDER,
@@ -16,12 +18,47 @@ from config_utils import (
     save_config,
     ensure_directories,
 )
+from camera_backends import create_camera_backend
+from camera_supervisor import CameraSupervisor
+from fast_start import BootTimer, run_in_background
+import metrics
+from metrics import REGISTRY, PROMETHEUS_CONTENT_TYPE, server_timing
+from funnel import FunnelTracker
+from printer_pool import PrinterPool
+from capture_sessions import CaptureSessionStore, current_booth_id
+from page_cache import PageCache, CachedPage, html_response
+from traffic_qos import QosScheduler
+from clip_capture import ClipRecorder, CLIP_EXTENSIONS
+from armed_capture import ArmedCaptureStore
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'photobooth_secret_key_2024')
 logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s', filename='/tmp/simplebooth.log', filemode='w')
 logger = logging.getLogger(__name__)
 
+# Chronométrage des requêtes et en-têtes Server-Timing
+metrics.init_app(app)
+
+camera_frames = REGISTRY.counter('camera_frames_total', 'Frames lues depuis la source caméra (avec ou sans spectateur)', ('backend',))
+stream_frames_sent = REGISTRY.counter('stream_frames_sent_total', 'Frames envoyées aux navigateurs (une par spectateur)', ('backend',))
+camera_dropped_frames = REGISTRY.counter('camera_dropped_frames_total', 'Frames estimées perdues (retard sur le framerate cible)', ('backend',))
+capture_outcomes = REGISTRY.counter('capture_total', 'Captures par méthode et résultat', ('method', 'outcome'))
+print_outcomes = REGISTRY.counter('print_total', 'Impressions par résultat', ('outcome',))
+print_phase_duration = REGISTRY.histogram('print_phase_duration_seconds', 'Durée des étapes du script d\'impression', ('phase',))
+qos_active_transfers = REGISTRY.gauge('qos_active_transfers', 'Transferts en cours par classe de trafic', ('traffic_class',))
+camera_up = REGISTRY.gauge('camera_up', 'Source caméra en train de produire des frames (1) ou non (0)', ('backend',))
+camera_restarts = REGISTRY.counter('camera_restarts_total', 'Relances de la source caméra par cause', ('backend', 'reason'))
+camera_recovery = REGISTRY.histogram('camera_recovery_seconds', 'Coupure du flux caméra avant rétablissement', ('backend',),
+                                     buckets=(0.25, 0.5, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 30.0, 60.0))
+capture_skew = REGISTRY.histogram('capture_skew_seconds', 'Écart absolu entre le « 0 » affiché et la frame capturée', (),
+                                  buckets=(0.005, 0.01, 0.02, 0.033, 0.05, 0.067, 0.1, 0.25, 0.5, 1.0))
+clip_outcomes = REGISTRY.counter('clip_total', 'Clips animés par format et résultat', ('format', 'outcome'))
+clip_encode_duration = REGISTRY.histogram('clip_encode_duration_seconds', 'Durée d\'encodage des clips animés (hors décodage)', ('format',))
+file_send_duration = REGISTRY.histogram('file_send_seconds', 'Durée réelle d\'envoi des photos (jusqu\'au dernier octet)', ('traffic_class',))
+qos_rejected_transfers = REGISTRY.counter('qos_rejected_total', 'Transferts refusés faute de créneau (503)', ('traffic_class',))
+
+boot_timer = BootTimer()
+
 # Initialiser les dossiers nécessaires
 ensure_directories()
 
@@ -50,22 +87,28 @@ def check_printer_status():
                 'paper_status': 'unknown'
             }
         
+        # Le papier n'est connu qu'après une impression : signalé par le pool
+        printers = printer_pool.snapshot()
+        paper_status = 'unknown' if printer_pool.has_paper() else 'no_paper'
+        
         # Vérifier simplement si le port existe (sans se connecter)
         if os.path.exists(printer_port):
             return {
                 'status': 'ok',
                 'message': 'Imprimante configurée',
-                'paper_status': 'unknown',
+                'paper_status': paper_status,
                 'port': printer_port,
-                'baudrate': printer_baudrate
+                'baudrate': printer_baudrate,
+                'printers': printers
             }
         else:
             return {
                 'status': 'error',
                 'message': f'Port {printer_port} introuvable',
-                'paper_status': 'unknown',
+                'paper_status': paper_status,
                 'port': printer_port,
-                'baudrate': printer_baudrate
+                'baudrate': printer_baudrate,
+                'printers': printers
             }
             
     except Exception as e:
@@ -120,89 +163,351 @@ def detect_serial_ports():
 
 # Variables globales
 config = load_config()
-current_photo = None
+# Photo courante de chaque borne (kiosque, tablette...), lecture sans verrou
+capture_sessions = CaptureSessionStore()
+# Captures armées pendant le compte à rebours, alimentées par le flux vidéo
+armed_captures = ArmedCaptureStore()
+# Attente d'une frame après l'échéance avant de revenir à la capture classique (s)
+ARMED_FRAME_TIMEOUT = 1.0
 camera_active = False
-camera_process = None
+camera_backend = create_camera_backend(config)
+funnel_tracker = FunnelTracker()
+# Rendus de /photos et /admin, invalidés par capture, suppression et sauvegarde de la config
+page_cache = PageCache(PHOTOS_FOLDER)
+# Durée de validité de la détection des ports série (forcée par ?refresh_ports=1)
+SERIAL_PORTS_TTL = 30
+
+# Priorités de trafic : flux et capture d'abord, galerie et téléchargements bornés
+qos = QosScheduler(camera_backend.framerate)
+qos.add_class('gallery',
+              concurrency=config.get('qos_gallery_concurrency', 4),
+              degraded_concurrency=2,
+              degraded_rate=512 * 1024)
+qos.add_class('bulk',
+              concurrency=config.get('qos_download_concurrency', 2),
+              rate=config.get('qos_download_rate_kbps', 1024) * 1024,
+              degraded_concurrency=1,
+              degraded_rate=256 * 1024)
+def clip_encoded(job):
+    """Fin d'encodage d'un clip (thread d'encodage) : métriques et galerie"""
+    if job.state == 'done':
+        clip_outcomes.inc(format=clip_recorder.format, outcome='success')
+        clip_encode_duration.observe(job.result['encode_ms'] / 1000, format=clip_recorder.format)
+        page_cache.bump_library()
+    else:
+        clip_outcomes.inc(format=clip_recorder.format, outcome='failure')
+
+# Clips animés enregistrés depuis l'aperçu, encodés dans un processus séparé
+clip_recorder = ClipRecorder(camera_backend.framerate,
+                             width=config.get('clip_width', 480),
+                             fmt=config.get('clip_format', 'gif'),
+                             on_done=clip_encoded)
+
+# Attente maximale d'un créneau avant de répondre 503
+QOS_WAIT_SECONDS = 10
+
+def send_photo_with_qos(traffic_class, filename, **kwargs):
+    """send_from_directory() dans une classe de trafic (créneau + débit limité)"""
+    if not qos.acquire(traffic_class, QOS_WAIT_SECONDS):
+        qos_rejected_transfers.inc(traffic_class=traffic_class)
+        response = Response('Serveur occupé, réessayez', status=503, mimetype='text/plain')
+        response.headers['Retry-After'] = '5'
+        return response
+    qos_active_transfers.inc(traffic_class=traffic_class)
+    start = time.perf_counter()
+    
+    def release():
+        qos_active_transfers.dec(traffic_class=traffic_class)
+        qos.release(traffic_class)
+    
+    def sent():
+        # Appelé après le dernier octet (ou l'abandon du client), bien après la vue
+        file_send_duration.observe(time.perf_counter() - start, traffic_class=traffic_class)
+        release()
+    
+    try:
+        response = send_from_directory(PHOTOS_FOLDER, filename, **kwargs)
+    except Exception:
+        release()
+        raise
+    # Le créneau reste pris jusqu'à la fin de l'envoi, pas seulement de la vue
+    body = response.response
+    response.response = qos.classes[traffic_class].throttle(body)
+    # Sans passthrough, Werkzeug appelle response.close() (et donc release) en fin d'envoi
+    response.direct_passthrough = False
+    if hasattr(body, 'close'):
+        response.call_on_close(body.close)
+    response.call_on_close(sent)
+    return response
 
 @app.route('/')
 def index():
     """Page principale avec aperçu vidéo"""
     return render_template('index.html', timer=config['timer_seconds'])
 
-# Variable globale pour stocker la dernière frame MJPEG
+# Dernière frame MJPEG : remplacée par simple affectation (atomique), lue sans verrou
 last_frame = None
-frame_lock = threading.Lock()
+previous_frame_time = None
+
+def on_camera_frame(jpeg_frame, timestamp):
+    """Chaque frame de la caméra (thread du superviseur) : capture, clips, métriques"""
+    global last_frame, previous_frame_time
+    # Stocker la frame pour capture instantanée
+    last_frame = jpeg_frame
+    
+    # Compter les frames et estimer celles perdues d'après l'écart au framerate cible
+    now = time.monotonic()
+    camera_frames.inc(backend=camera_backend.name)
+    camera_up.set(1, backend=camera_backend.name)
+    qos.record_frame(now)
+    clip_recorder.feed(jpeg_frame, now)
+    armed_captures.feed(jpeg_frame, timestamp)
+    if previous_frame_time is not None:
+        missed = int((now - previous_frame_time) * camera_backend.framerate + 0.5) - 1
+        if missed > 0:
+            camera_dropped_frames.inc(missed, backend=camera_backend.name)
+    previous_frame_time = now
+
+def on_camera_restart(reason):
+    global previous_frame_time
+    previous_frame_time = None
+    camera_up.set(0, backend=camera_backend.name)
+    camera_restarts.inc(backend=camera_backend.name, reason=reason)
+
+# Seul propriétaire de la source caméra : démarrage, chien de garde, relances
+camera_supervisor = CameraSupervisor(
+    camera_backend,
+    on_frame=on_camera_frame,
+    on_restart=on_camera_restart,
+    on_recovered=lambda seconds: camera_recovery.observe(seconds, backend=camera_backend.name),
+    stall_timeout=config.get('camera_stall_timeout_ms', 1000) / 1000)
 
 @app.route('/capture', methods=['POST'])
 def capture_photo():
     """Capturer une photo selon le type de caméra configuré"""
-    global current_photo, last_frame
+    booth_id = current_booth_id()
+    session_id = (request.get_json(silent=True) or {}).get('session_id')
     
+    # Les transferts de la galerie ralentissent le temps de la capture
+    with qos.priority():
+        return capture_with_backend(booth_id, session_id)
+
+def new_photo_filename():
+    """Nom de fichier unique (microsecondes : plusieurs bornes peuvent capturer dans la même seconde)"""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    return f'photo_{timestamp}.jpg'
+
+def record_capture(booth_id, session_id, filename, method):
+    """Photo enregistrée : photo courante de la borne, galerie, métriques et parcours invité"""
+    capture_sessions.set_photo(booth_id, filename)
+    page_cache.bump_library()
+    capture_outcomes.inc(method=method, outcome='success')
+    funnel_tracker.record(session_id, 'shutter')
+
+def capture_with_backend(booth_id, session_id):
+    """Prendre la photo (rpicam-still ou dernière frame MJPEG) pour la borne booth_id"""
     try:
-        # Générer un nom de fichier unique
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f'photo_{timestamp}.jpg'
+        filename = new_photo_filename()
         filepath = os.path.join(PHOTOS_FOLDER, filename)
         
-        # Utiliser rpicam-still pour une capture haute qualité
-        logger.info("[CAPTURE] Utilisation de rpicam-still pour capture haute qualité")
+        # Capture haute qualité si le backend le permet (rpicam-still)
+        logger.info(f"[CAPTURE] Capture via le backend {camera_backend.name}")
         try:
-            cmd = [
-                '/usr/bin/rpicam-still',
-                '-o', filepath,
-                '--timeout', '1000',
-                '--width', '1280',      # Résolution réduite pour éviter fichiers trop lourds
-                '--height', '720',       # Format 16:9 standard
-                '--quality', '75',       # Compression JPEG pour réduire la taille
-                '--nopreview'
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-            
-            if result.returncode == 0 and os.path.exists(filepath):
-                current_photo = filename
+            if camera_backend.capture_still(filepath):
+                record_capture(booth_id, session_id, filename, 'still')
                 logger.info(f"Photo capturée avec succès: {filename}")
                 return jsonify({'success': True, 'filename': filename})
-            else:
-                raise Exception(f"Échec rpicam-still: {result.stderr}")
-                
         except Exception as e:
-            logger.info(f"Erreur rpicam-still, fallback vers frame MJPEG: {e}")
+            capture_outcomes.inc(method='still', outcome='failure')
+            logger.info(f"Erreur capture haute qualité, fallback vers frame MJPEG: {e}")
         
         # Fallback - capturer la frame actuelle du flux MJPEG
-        with frame_lock:
-            if last_frame is not None:
-                # Sauvegarder la frame directement
-                with open(filepath, 'wb') as f:
-                    f.write(last_frame)
-                
-                current_photo = filename
-                logger.info(f"Frame MJPEG capturée avec succès: {filename}")
-                
-                return jsonify({'success': True, 'filename': filename})
-            else:
-                logger.info("Aucune frame disponible dans le flux")
-                return jsonify({'success': False, 'error': 'Aucune frame disponible'})
+        frame = last_frame
+        if frame is not None:
+            # Sauvegarder la frame directement
+            with open(filepath, 'wb') as f:
+                f.write(frame)
+            
+            record_capture(booth_id, session_id, filename, 'mjpeg_fallback')
+            logger.info(f"Frame MJPEG capturée avec succès: {filename}")
+            
+            return jsonify({'success': True, 'filename': filename})
+        else:
+            capture_outcomes.inc(method='mjpeg_fallback', outcome='failure')
+            logger.info("Aucune frame disponible dans le flux")
+            return jsonify({'success': False, 'error': 'Aucune frame disponible'})
             
     except Exception as e:
         logger.info(f"Erreur lors de la capture: {e}")
         return jsonify({'success': False, 'error': f'Erreur de capture: {str(e)}'})
 
+@app.route('/capture/arm', methods=['POST'])
+def arm_capture():
+    """Armer une capture au début du compte à rebours, retourne le temps restant avant le « 0 »"""
+    data = request.get_json(silent=True) or {}
+    try:
+        countdown_ms = float(data.get('countdown_ms', config['timer_seconds'] * 1000))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Compte à rebours invalide'})
+    
+    shot = armed_captures.arm(current_booth_id(), countdown_ms / 1000)
+    logger.info(f"[CAPTURE] Capture {shot.id} armée dans {countdown_ms:.0f} ms")
+    return jsonify({'success': True, 'arm_id': shot.id, 'fire_in_ms': shot.remaining() * 1000})
+
+@app.route('/capture/fire/<arm_id>', methods=['POST'])
+def fire_capture(arm_id):
+    """Récupérer la frame la plus proche du « 0 » affiché (capture classique si aucune)"""
+    booth_id = current_booth_id()
+    data = request.get_json(silent=True) or {}
+    session_id = data.get('session_id')
+    shot = armed_captures.get(arm_id, booth_id)
+    if shot is None:
+        return jsonify({'success': False, 'error': 'Capture armée inconnue ou expirée'})
+    
+    with qos.priority():
+        got_frame = shot.wait(max(0.0, shot.remaining()) + ARMED_FRAME_TIMEOUT)
+        armed_captures.discard(arm_id)
+        if not got_frame:
+            # Flux arrêté : pas de frame horodatée, capture classique
+            logger.info(f"[CAPTURE] Aucune frame pour la capture armée {arm_id}, capture classique")
+            return capture_with_backend(booth_id, session_id)
+        
+        try:
+            filename = new_photo_filename()
+            with open(os.path.join(PHOTOS_FOLDER, filename), 'wb') as f:
+                f.write(shot.frame)
+        except Exception as e:
+            logger.info(f"Erreur lors de la capture: {e}")
+            return jsonify({'success': False, 'error': f'Erreur de capture: {str(e)}'})
+    
+    record_capture(booth_id, session_id, filename, 'armed_frame')
+    # Le « 0 » a été peint display_lag_ms après l'échéance : l'écart perçu en tient compte
+    try:
+        display_lag = float(data.get('display_lag_ms', 0)) / 1000
+    except (TypeError, ValueError):
+        display_lag = 0.0
+    skew = shot.skew - display_lag
+    capture_skew.observe(abs(skew))
+    # 'arrival' : écart calculé sur l'instant de réception (rpicam), juste si camera_latency_ms est calibré
+    timestamp_source = camera_backend.timestamp_source
+    logger.info(f"[CAPTURE] Capture armée {arm_id}: {filename}, écart {skew * 1000:+.1f} ms ({timestamp_source})")
+    return jsonify({'success': True, 'filename': filename, 'skew_ms': round(skew * 1000, 1),
+                    'timestamp_source': timestamp_source})
+
+@app.route('/capture_clip', methods=['POST'])
+def capture_clip():
+    """Enregistrer les prochaines secondes de l'aperçu en clip animé (encodage en arrière-plan)"""
+    data = request.get_json(silent=True) or {}
+    try:
+        seconds = float(data.get('seconds', config.get('clip_seconds', 3)))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Durée invalide'})
+    
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    filepath = os.path.join(PHOTOS_FOLDER, f'clip_{timestamp}{clip_recorder.extension}')
+    try:
+        job = clip_recorder.start(filepath, seconds, boomerang=bool(data.get('boomerang')),
+                                  booth_id=current_booth_id())
+    except RuntimeError as e:
+        return jsonify({'success': False, 'error': str(e)})
+    return jsonify({'success': True, 'clip_id': job.id, 'filename': job.filename, 'seconds': job.seconds})
+
+@app.route('/api/clip/<clip_id>')
+def get_clip_status(clip_id):
+    """Avancement d'un clip : recording, encoding, done (avec durées) ou error"""
+    job = clip_recorder.get(clip_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Clip inconnu'}), 404
+    return jsonify(dict(job.snapshot(), success=job.state != 'error'))
+
 @app.route('/review')
 def review_photo():
     """Page de révision de la photo"""
+    current_photo = capture_sessions.get_photo(current_booth_id())
     if not current_photo:
         return redirect(url_for('index'))
-    return render_template('review.html', photo=current_photo, config=config)
+    return render_template('review.html', photo=current_photo, config=config,
+                           session_id=request.args.get('session'))
+
+# Délai maximal d'attente d'une impression (file comprise)
+PRINT_TIMEOUT = 300
+
+def get_print_python():
+    """Interpréteur Python pour le script d'impression (venv si présent)"""
+    venv_python = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'venv', 'bin', 'python')
+    if os.path.exists(venv_python):
+        return venv_python
+    return sys.executable
+
+def parse_print_timings(stdout):
+    """Extraire les durées d'impression (ms) émises par ScriptPythonPOS.py"""
+    for line in (stdout or '').splitlines():
+        if line.startswith('TIMINGS '):
+            try:
+                return json.loads(line[len('TIMINGS '):])
+            except ValueError:
+                return {}
+    return {}
+
+def record_print_result(result):
+    """Compter le résultat d'une impression du pool et la durée de ses étapes"""
+    print_outcomes.inc(outcome=result['status'])
+    if result['status'] != 'success':
+        return {}
+    timings = parse_print_timings(result['stdout'])
+    for key, duration_ms in timings.items():
+        print_phase_duration.observe(duration_ms / 1000, phase=key.replace('_ms', ''))
+    return timings
+
+def run_print_script(printer_port, photo_path):
+    """Lancer ScriptPythonPOS.py sur une imprimante du pool"""
+    # Construire la commande d'impression
+    cmd = [get_print_python(), 'ScriptPythonPOS.py', '--image', os.path.abspath(photo_path)]
+    
+    # Ajouter les paramètres de port et baudrate
+    printer_baudrate = config.get('printer_baudrate', 9600)
+    cmd.extend(['--port', printer_port, '--baudrate', str(printer_baudrate)])
+    
+    # Ajouter le texte de pied de page si configuré
+    footer_text = config.get('footer_text', '')
+    if footer_text:
+        cmd.extend(['--text', footer_text])
+
+    # Ajouter l'option haute résolution selon la configuration
+    print_resolution = config.get('print_resolution', 384)
+    if print_resolution > 384:
+        cmd.append('--hd')
+    
+    result = subprocess.run(cmd, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    logger.info(f"[PRINTER] {printer_port}: {os.path.basename(photo_path)} -> code {result.returncode}")
+    return result
+
+def get_printer_ports():
+    """Ports du pool : imprimante principale + imprimantes supplémentaires"""
+    ports = [config.get('printer_port', '/dev/ttyAMA0')]
+    ports.extend(config.get('printer_extra_ports', []))
+    return list(dict.fromkeys(ports))
+
+def print_error_message(result):
+    """Message d'erreur lisible pour une impression échouée"""
+    error_msg = result['stderr'].strip() if result['stderr'] else 'Erreur inconnue'
+    if 'ModuleNotFoundError' in error_msg and 'escpos' in error_msg:
+        return 'Module escpos manquant. Installez-le avec: pip install python-escpos'
+    return f'Erreur d\'impression: {error_msg}'
+
+printer_pool = PrinterPool(run_print_script, get_printer_ports())
 
 @app.route('/print_photo', methods=['POST'])
 def print_photo():
     """Imprimer la photo actuelle"""
-    global current_photo
+    current_photo = capture_sessions.get_photo(current_booth_id())
     
     if not current_photo:
         return jsonify({'success': False, 'error': 'Aucune photo à imprimer'})
     
+    session_id = (request.get_json(silent=True) or {}).get('session_id')
+    funnel_tracker.record(session_id, 'print_requested')
+    
     try:
         # Vérifier si l'imprimante est activée
         if not config.get('printer_enabled', True):
@@ -218,39 +523,23 @@ def print_photo():
         if not os.path.exists(script_path):
             return jsonify({'success': False, 'error': 'Script d\'impression introuvable (ScriptPythonPOS.py)'})
         
-        # Construire la commande d'impression avec les nouveaux paramètres
-        venv_python = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'venv', 'bin', 'python')
-        cmd = [venv_python, 'ScriptPythonPOS.py', '--image', photo_path]
+        # Envoyer au pool : l'imprimante la moins chargée qui a du papier
+        job = printer_pool.submit(photo_path)
+        with server_timing('print'):
+            result = job.wait(PRINT_TIMEOUT)
+        if result is None:
+            return jsonify({'success': False, 'error': 'Délai d\'impression dépassé'})
+        timings = record_print_result(result)
         
-        # Ajouter les paramètres de port et baudrate
-        printer_port = config.get('printer_port', '/dev/ttyAMA0')
-        printer_baudrate = config.get('printer_baudrate', 9600)
-        cmd.extend(['--port', printer_port, '--baudrate', str(printer_baudrate)])
-        
-        # Ajouter le texte de pied de page si configuré
-        footer_text = config.get('footer_text', '')
-        if footer_text:
-            cmd.extend(['--text', footer_text])
-
-        # Ajouter l'option haute résolution selon la configuration
-        print_resolution = config.get('print_resolution', 384)
-        if print_resolution > 384:
-            cmd.append('--hd')
-        
-        # Exécuter l'impression
-        result = subprocess.run(cmd, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
-        
-        if result.returncode == 0:
-            return jsonify({'success': True, 'message': 'Photo imprimée avec succès!'})
-        elif result.returncode == 2:
-            # Code d'erreur spécifique pour manque de papier
+        if result['status'] == 'success':
+            funnel_tracker.record(session_id, 'print_finished')
+            return jsonify({'success': True, 'message': 'Photo imprimée avec succès!',
+                            'timings': timings, 'printer': result['port']})
+        elif result['status'] == 'no_paper':
+            # Toutes les imprimantes du pool sont à court de papier
             return jsonify({'success': False, 'error': 'Plus de papier dans l\'imprimante', 'error_type': 'no_paper'})
         else:
-            error_msg = result.stderr.strip() if result.stderr else 'Erreur inconnue'
-            if 'ModuleNotFoundError' in error_msg and 'escpos' in error_msg:
-                return jsonify({'success': False, 'error': 'Module escpos manquant. Installez-le avec: pip install python-escpos'})
-            else:
-                return jsonify({'success': False, 'error': f'Erreur d\'impression: {error_msg}'})
+            return jsonify({'success': False, 'error': print_error_message(result)})
             
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
@@ -258,7 +547,8 @@ def print_photo():
 @app.route('/delete_current', methods=['POST'])
 def delete_current_photo():
     """Supprimer la photo actuelle"""
-    global current_photo
+    booth_id = current_booth_id()
+    current_photo = capture_sessions.get_photo(booth_id)
     
     if current_photo:
         try:
@@ -267,7 +557,8 @@ def delete_current_photo():
             
             if os.path.exists(photo_path):
                 os.remove(photo_path)
-                current_photo = None
+                capture_sessions.set_photo(booth_id, None)
+                page_cache.bump_library()
                 return jsonify({'success': True})
             else:
                 return jsonify({'success': False, 'error': 'Photo introuvable'})
@@ -276,6 +567,40 @@ def delete_current_photo():
     
     return jsonify({'success': False, 'error': 'Aucune photo à supprimer'})
 
+def list_photos():
+    """Lister les photos du dossier PHOTOS_FOLDER (plus récentes en premier)"""
+    entries = []
+    if os.path.exists(PHOTOS_FOLDER):
+        # scandir évite un stat séparé par fichier pour le type
+        with os.scandir(PHOTOS_FOLDER) as it:
+            for entry in it:
+                if entry.name.lower().endswith(('.png', '.jpg', '.jpeg') + CLIP_EXTENSIONS):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.name, stat.st_size))
+    
+    # Trier les photos par date (plus récentes en premier)
+    entries.sort(reverse=True)
+    
+    return [{
+        'filename': filename,
+        'size_kb': size / 1024,  # Taille en KB
+        'date': datetime.fromtimestamp(mtime).strftime("%d/%m/%Y %H:%M"),
+        'type': 'clip' if filename.lower().endswith(CLIP_EXTENSIONS) else 'photo',
+        'folder': PHOTOS_FOLDER
+    } for mtime, filename, size in entries]
+
+def render_photos_page():
+    """Page /photos complète (mise en cache par version de la photothèque)"""
+    # Récupérer la liste des photos avec leurs métadonnées
+    with server_timing('index'):
+        photos = list_photos()
+    
+    with server_timing('render'):
+        return render_template('photos.html', 
+                               photos=photos,
+                               photo_count=len(photos),
+                               config=config)
+
 @app.route('/photos')
 def photos_page():
     """Page dédiée à la gestion des photos"""
@@ -283,35 +608,19 @@ def photos_page():
     if not os.path.exists(PHOTOS_FOLDER):
         os.makedirs(PHOTOS_FOLDER)
     
-    # Récupérer la liste des photos avec leurs métadonnées
-    photos = []
-    
-    # Récupérer les photos du dossier PHOTOS_FOLDER
-    if os.path.exists(PHOTOS_FOLDER):
-        for filename in os.listdir(PHOTOS_FOLDER):
-            if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-                file_path = os.path.join(PHOTOS_FOLDER, filename)
-                file_size_kb = os.path.getsize(file_path) / 1024  # Taille en KB
-                file_date = datetime.fromtimestamp(os.path.getmtime(file_path))
-                
-                photos.append({
-                    'filename': filename,
-                    'size_kb': file_size_kb,
-                    'date': file_date.strftime("%d/%m/%Y %H:%M"),
-                    'type': 'photo',
-                    'folder': PHOTOS_FOLDER
-                })
-    
-    # Trier les photos par date (plus récentes en premier)
-    photos.sort(key=lambda x: datetime.strptime(x['date'], "%d/%m/%Y %H:%M"), reverse=True)
-    
-    # Compter les photos
-    photo_count = len(photos)
+    # Des messages flash en attente font partie du rendu : pas de cache
+    if session.get('_flashes'):
+        return html_response(CachedPage(render_photos_page()))
     
-    return render_template('photos.html', 
-                           photos=photos,
-                           photo_count=photo_count,
-                           config=config)
+    with server_timing('cache'):
+        page = page_cache.get_or_render('photos', render_photos_page)
+    return html_response(page)
+
+def render_admin_photos():
+    """Tableau des photos de /admin et nombre de photos (mis en cache par version)"""
+    photos = list_photos()
+    return CachedPage(render_template('admin_photos.html', photos=photos),
+                      {'photo_count': len(photos)})
 
 @app.route('/admin')
 def admin():
@@ -319,44 +628,29 @@ def admin():
     if not os.path.exists(PHOTOS_FOLDER):
         os.makedirs(PHOTOS_FOLDER)
     
-    # Récupérer la liste des photos avec leurs métadonnées
-    photos = []
-    
-    # Récupérer les photos du dossier PHOTOS_FOLDER
-    if os.path.exists(PHOTOS_FOLDER):
-        for filename in os.listdir(PHOTOS_FOLDER):
-            if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-                file_path = os.path.join(PHOTOS_FOLDER, filename)
-                file_size_kb = os.path.getsize(file_path) / 1024  # Taille en KB
-                file_date = datetime.fromtimestamp(os.path.getmtime(file_path))
-                
-                photos.append({
-                    'filename': filename,
-                    'size_kb': file_size_kb,
-                    'date': file_date.strftime("%d/%m/%Y %H:%M"),
-                    'type': 'photo',
-                    'folder': PHOTOS_FOLDER
-                })
-    
-    # Trier les photos par date (plus récentes en premier)
-    photos.sort(key=lambda x: datetime.strptime(x['date'], "%d/%m/%Y %H:%M"), reverse=True)
-    
-    # Compter les photos
-    photo_count = len(photos)
-    
-    # Détecter les ports série disponibles
-    available_serial_ports = detect_serial_ports()
+    # Tableau des photos : re-rendu seulement si la photothèque a changé
+    with server_timing('index'):
+        photos_table = page_cache.get_or_render('admin_photos', render_admin_photos)
     
-    # Charger la configuration
-    config = load_config()
+    # Détecter les ports série disponibles (résultat conservé SERIAL_PORTS_TTL secondes)
+    with server_timing('ports'):
+        if request.args.get('refresh_ports'):
+            page_cache.invalidate('serial_ports')
+        available_serial_ports = page_cache.get_or_compute('serial_ports', detect_serial_ports,
+                                                           SERIAL_PORTS_TTL)
     
-    return render_template('admin.html', 
-                           config=config, 
-                           photos=photos,
-                           photo_count=photo_count,
-                           
-                           available_serial_ports=available_serial_ports,
-                           show_toast=request.args.get('show_toast', False))
+    # La configuration globale est tenue à jour par save_admin_config()
+    with server_timing('render'):
+        page = CachedPage(render_template('admin.html', 
+                                          config=config, 
+                                          photos_table=Markup(photos_table.text),
+                                          photo_count=photos_table.meta['photo_count'],
+                                          
+                                          available_serial_ports=available_serial_ports,
+                                          funnel_stats=funnel_tracker.stats(),
+                                          printers=printer_pool.snapshot(),
+                                          show_toast=request.args.get('show_toast', False)))
+    return html_response(page)
 
 @app.route('/admin/save', methods=['POST'])
 def save_admin_config():
@@ -373,6 +667,8 @@ def save_admin_config():
         # Configuration de l'imprimante
         config['printer_enabled'] = 'printer_enabled' in request.form
         config['printer_port'] = request.form.get('printer_port', '/dev/ttyAMA0')
+        config['printer_extra_ports'] = [port for port in request.form.getlist('printer_extra_ports')
+                                         if port != config['printer_port']]
         
         printer_baudrate = request.form.get('printer_baudrate', '9600').strip()
         try:
@@ -387,6 +683,8 @@ def save_admin_config():
             config['print_resolution'] = 384
         
         save_config(config)
+        page_cache.bump_config()
+        printer_pool.configure(get_printer_ports())
         flash('Configuration sauvegardée avec succès!', 'success')
         
     except Exception as e:
@@ -403,9 +701,11 @@ def delete_all_photos():
         # Supprimer toutes les photos
         if os.path.exists(PHOTOS_FOLDER):
             for filename in os.listdir(PHOTOS_FOLDER):
-                if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
+                if filename.lower().endswith(('.png', '.jpg', '.jpeg') + CLIP_EXTENSIONS):
                     os.remove(os.path.join(PHOTOS_FOLDER, filename))
                     deleted_count += 1
+        capture_sessions.clear()
+        page_cache.bump_library()
         
         flash(f'{deleted_count} photo(s) supprimée(s) avec succès!', 'success')
     except Exception as e:
@@ -413,6 +713,23 @@ def delete_all_photos():
     
     return redirect(url_for('admin'))
 
+@app.route('/admin/printer_paper_loaded', methods=['POST'])
+def printer_paper_loaded():
+    """Remettre en service une imprimante du pool après rechargement du papier"""
+    port = request.form.get('port', '')
+    if printer_pool.mark_paper_loaded(port):
+        flash(f'Imprimante {port} remise en service', 'success')
+    else:
+        flash(f'Imprimante {port} absente du pool', 'error')
+    return redirect(url_for('admin'))
+
+@app.route('/admin/reset_funnel', methods=['POST'])
+def reset_funnel():
+    """Démarrer un nouvel événement pour les statistiques du parcours invité"""
+    funnel_tracker.reset()
+    flash('Statistiques du parcours invité réinitialisées', 'success')
+    return redirect(url_for('admin'))
+
 @app.route('/admin/delete_photo/<filename>', methods=['POST'])
 def delete_photo(filename):
     """Supprimer une photo spécifique"""
@@ -420,6 +737,8 @@ def delete_photo(filename):
         file_path = os.path.join(PHOTOS_FOLDER, filename)
         if os.path.exists(file_path):
             os.remove(file_path)
+            capture_sessions.forget_photo(filename)
+            page_cache.bump_library()
             return jsonify({'success': True, 'message': 'Photo supprimée avec succès'})
         else:
             return jsonify({'success': False, 'error': 'Photo introuvable'})
@@ -432,7 +751,7 @@ def download_photo(filename):
     try:
         # Chercher la photo dans le dossier photos
         if os.path.exists(os.path.join(PHOTOS_FOLDER, filename)):
-            return send_from_directory(PHOTOS_FOLDER, filename, as_attachment=True)
+            return send_photo_with_qos('bulk', filename, as_attachment=True)
         else:
             flash('Photo introuvable', 'error')
             return redirect(url_for('admin'))
@@ -454,46 +773,26 @@ def reprint_photo(filename):
                 flash('Script d\'impression introuvable (ScriptPythonPOS.py)', 'error')
                 return redirect(url_for('admin'))
             
-            # Utiliser le script d'impression existant
-            import subprocess
-            venv_python = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'venv', 'bin', 'python')
-            cmd = [
-                venv_python, 'ScriptPythonPOS.py',
-                '--image', photo_path
-            ]
-            
-            # Ajouter les paramètres de port et baudrate
-            printer_port = config.get('printer_port', '/dev/ttyAMA0')
-            printer_baudrate = config.get('printer_baudrate', 9600)
-            cmd.extend(['--port', printer_port, '--baudrate', str(printer_baudrate)])
-            
-            # Ajouter le texte de pied de page si défini
-            footer_text = config.get('footer_text', '')
-            if footer_text:
-                cmd.extend(['--text', footer_text])
-            
-            # Ajouter l'option HD si la résolution est élevée
-            print_resolution = config.get('print_resolution', 384)
-            if print_resolution > 384:
-                cmd.append('--hd')
-
-            result = subprocess.run(cmd, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+            # Envoyer au pool d'imprimantes
+            result = printer_pool.submit(photo_path).wait(PRINT_TIMEOUT)
+            if result is None:
+                flash('Délai d\'impression dépassé', 'error')
+                return redirect(url_for('admin'))
+            record_print_result(result)
             
             # Logger les détails
-            logger.info(f"[REPRINT] Command: {' '.join(cmd)}")
-            logger.info(f"[REPRINT] Return code: {result.returncode}")
-            logger.info(f"[REPRINT] Stdout: {result.stdout}")
-            logger.info(f"[REPRINT] Stderr: {result.stderr}")
+            logger.info(f"[REPRINT] Printer: {result['port']}")
+            logger.info(f"[REPRINT] Return code: {result['returncode']}")
+            logger.info(f"[REPRINT] Stdout: {result['stdout']}")
+            logger.info(f"[REPRINT] Stderr: {result['stderr']}")
             
-            if result.returncode == 0:
+            if result['status'] == 'success':
                 flash('Photo réimprimée avec succès!', 'success')
                 logger.info("[REPRINT] Success!")
+            elif result['status'] == 'no_paper':
+                flash('Plus de papier dans les imprimantes', 'error')
             else:
-                error_msg = result.stderr.strip() if result.stderr else 'Erreur inconnue'
-                if 'ModuleNotFoundError' in error_msg and 'escpos' in error_msg:
-                    flash('Module escpos manquant. Installez-le avec: pip install python-escpos', 'error')
-                else:
-                    flash(f'Erreur d\'impression: {error_msg}', 'error')
+                flash(print_error_message(result), 'error')
         else:
             flash('Photo introuvable', 'error')
     except Exception as e:
@@ -506,12 +805,56 @@ def get_printer_status():
     """API pour vérifier l'état de l'imprimante"""
     return jsonify(check_printer_status())
 
+@app.route('/api/printers')
+def get_printers():
+    """État, files et débit de chaque imprimante du pool"""
+    return jsonify(printer_pool.snapshot())
+
+@app.route('/api/session/start', methods=['POST'])
+def start_guest_session():
+    """Début du compte à rebours : nouvelle session invité"""
+    return jsonify({'session_id': funnel_tracker.start_session()})
+
+@app.route('/api/session/<session_id>/stage', methods=['POST'])
+def record_guest_stage(session_id):
+    """Étapes horodatées côté navigateur (affichage de la révision)"""
+    stage = (request.get_json(silent=True) or {}).get('stage')
+    if stage != 'review_shown':
+        return jsonify({'success': False, 'error': 'Étape inconnue'}), 400
+    return jsonify({'success': funnel_tracker.record(session_id, stage)})
+
+@app.route('/api/camera')
+def get_camera_status():
+    """État de la source caméra : relances, dernière coupure, diagnostic"""
+    return jsonify(camera_supervisor.snapshot())
+
+@app.route('/api/qos')
+def get_qos():
+    """État des classes de trafic et du flux caméra"""
+    return jsonify(qos.snapshot())
+
+@app.route('/api/metrics')
+def get_metrics():
+    """Métriques au format texte Prometheus"""
+    return Response(REGISTRY.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+def is_booth_media(filename):
+    """Photo courante ou clip récent de la borne qui demande (révision, résultat du clip)"""
+    # Sans créer d'identifiant : un simple visiteur de la galerie n'a pas de borne
+    booth_id = current_booth_id(create=False)
+    if booth_id is None:
+        return False
+    return (filename == capture_sessions.get_photo(booth_id)
+            or clip_recorder.recorded_by(filename, booth_id))
+
 @app.route('/photos/<filename>')
 def serve_photo(filename):
     """Servir les photos"""
     # Vérifier dans le dossier photos
     if os.path.exists(os.path.join(PHOTOS_FOLDER, filename)):
-        return send_from_directory(PHOTOS_FOLDER, filename)
+        # Le kiosque ne fait pas la queue derrière les téléphones qui parcourent la galerie
+        traffic_class = 'realtime' if is_booth_media(filename) else 'gallery'
+        return send_photo_with_qos(traffic_class, filename)
     else:
         abort(404)
 
@@ -527,104 +870,41 @@ def video_stream():
     return response
 
 def generate_video_stream():
-    """Générer le flux vidéo MJPEG avec la Pi Camera"""
-    global camera_process, last_frame
-    
+    """Envoyer au navigateur les frames publiées par le superviseur caméra"""
+    # Compter le spectateur dans la classe temps réel (jamais limitée)
+    qos.acquire('realtime', 0)
+    # La source démarre avec le premier spectateur (ou tourne déjà, préchauffée)
+    camera_supervisor.acquire()
     try:
-        # Arrêter tout processus caméra existant
-        stop_camera_process()
-        
-        logger.info("[CAMERA] Démarrage de la Pi Camera...")
-        # Commande rpicam-vid pour flux MJPEG - résolution 16/9
-        cmd = [
-            '/usr/bin/rpicam-vid',
-            '--codec', 'mjpeg',
-            '--width', '1280',   # Résolution native plus compatible
-            '--height', '720',   # Vrai 16/9 sans bandes noires
-            '--framerate', '15', # Framerate plus élevé pour cette résolution
-            '--timeout', '0',    # Durée infinie
-            '--output', '-',     # Sortie vers stdout
-            '--inline',          # Headers inline
-            '--flush',           # Flush immédiat
-            '--nopreview'        # Pas d'aperçu local
-        ]
-
-        logger.info(f"[CAMERA] Commande: {' '.join(cmd)}")
-        camera_process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            bufsize=0
-        )
-
-        # Lire stderr pour voir les erreurs
-        stderr_thread = threading.Thread(target=lambda: logger.info(f"[CAMERA] STDERR: {camera_process.stderr.read().decode()}"))
-        stderr_thread.start()
-
-        logger.info("[CAMERA] Processus démarré, attente des données...")
-        # Buffer pour assembler les frames JPEG
-        buffer = b''
-
-        while camera_process and camera_process.poll() is None:
-            try:
-                # Lire les données par petits blocs
-                chunk = camera_process.stdout.read(1024)
-                if not chunk:
-                    logger.info("[CAMERA] Fin du flux")
+        sequence = None
+        while True:
+            published = camera_supervisor.next_frame(sequence, timeout=1.0)
+            if published is None:
+                if not camera_supervisor.active:
+                    # Arrêt forcé (fin de l'application)
                     break
-
-                buffer += chunk
-
-                # Chercher les marqueurs JPEG
-                while True:
-                    # Chercher le début d'une frame JPEG (0xFFD8)
-                    start = buffer.find(b'\xff\xd8')
-                    if start == -1:
-                        break
-
-                    # Chercher la fin de la frame JPEG (0xFFD9)
-                    end = buffer.find(b'\xff\xd9', start + 2)
-                    if end == -1:
-                        break
-
-                    # Extraire la frame complète
-                    jpeg_frame = buffer[start:end + 2]
-                    buffer = buffer[end + 2:]
-
-                    # Stocker la frame pour capture instantanée
-                    with frame_lock:
-                        last_frame = jpeg_frame
-
-                    logger.info(f"[CAMERA] Frame extraite, taille: {len(jpeg_frame)} bytes")
-                    # Envoyer la frame au navigateur
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n'
-                           b'Content-Length: ' + str(len(jpeg_frame)).encode() + b'\r\n\r\n' +
-                           jpeg_frame + b'\r\n')
-            except Exception as e:
-                logger.info(f"[CAMERA] Erreur lecture flux: {e}")
-                break
+                # Relance en cours : garder la connexion ouverte
+                continue
+            sequence, jpeg_frame, _ = published
+            
+            # Envoyer la frame au navigateur
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n'
+                   b'Content-Length: ' + str(len(jpeg_frame)).encode() + b'\r\n\r\n' +
+                   jpeg_frame + b'\r\n')
+            stream_frames_sent.inc(backend=camera_backend.name)
+            boot_timer.first_frame_served()
                 
     except Exception as e:
         logger.info(f"Erreur flux vidéo: {e}")
     finally:
-        stop_camera_process()
+        camera_supervisor.release()
+        qos.release('realtime')
 
 def stop_camera_process():
-    """Arrêter proprement le processus caméra"""
-    global camera_process
-    
-    # Arrêter le processus libcamera-vid si actif
-    if camera_process:
-        try:
-            camera_process.terminate()
-            camera_process.wait(timeout=2)
-        except:
-            try:
-                camera_process.kill()
-            except:
-                pass
-        camera_process = None
+    """Arrêter la source caméra pour tous les spectateurs (fin de l'application uniquement)"""
+    camera_supervisor.stop()
+    camera_up.set(0, backend=camera_backend.name)
 
 @app.route('/start_camera')
 def start_camera():
@@ -635,10 +915,11 @@ def start_camera():
 
 @app.route('/stop_camera')
 def stop_camera():
-    """Arrêter l'aperçu caméra"""
+    """Fin de l'aperçu pour ce navigateur (la source est partagée)"""
     global camera_active
     camera_active = False
-    stop_camera_process()
+    # Pas d'arrêt ici : la fermeture de /video_stream libère ce spectateur et la
+    # source s'arrête avec le dernier (autres navigateurs, caméra préchauffée)
     return jsonify({'status': 'camera_stopped'})
 
 @app.route('/restart_kiosk', methods=['POST'])
@@ -666,6 +947,7 @@ def exit_kiosk():
 def cleanup():
     logger.info("[APP] Arrêt de l'application, nettoyage des ressources...")
     stop_camera_process()
+    clip_recorder.shutdown()
 
 def signal_handler(sig, frame):
     stop_camera_process()
@@ -717,9 +999,38 @@ def print_startup_info():
     except Exception as e:
         logger.warning(f"[STARTUP] Erreur lors de l'impression au démarrage: {str(e)}")
 
+def warm_camera():
+    """Démarrer la caméra et attendre sa première frame avant l'arrivée du navigateur"""
+    # Le premier flux reprend la source supervisée sans la relancer
+    camera_supervisor.start()
+    camera_supervisor.next_frame(timeout=camera_supervisor.startup_timeout)
+
+def warm_templates():
+    """Compiler les templates Jinja à l'avance (cache de l'environnement)"""
+    for template_name in ('index.html', 'review.html', 'photos.html', 'admin.html'):
+        app.jinja_env.get_template(template_name)
+
+def warm_page_cache():
+    """Rendre /photos et le tableau de /admin dans le cache avant la première visite"""
+    # Contexte de requête factice : url_for() et les templates comme pour une vraie visite
+    with app.test_request_context('/photos'):
+        page_cache.get_or_render('photos', render_photos_page)
+        page_cache.get_or_render('admin_photos', render_admin_photos)
+
+def start_fast_boot():
+    """Préchauffer caméra, templates et pages photos en parallèle du serveur web"""
+    boot_timer.mark('fast_start')
+    run_in_background(boot_timer, 'camera', warm_camera)
+    run_in_background(boot_timer, 'templates', warm_templates)
+    run_in_background(boot_timer, 'photos', warm_page_cache)
+
 if __name__ == '__main__':
     # Imprimer les infos de démarrage
     # print_startup_info()
     
+    # Mode démarrage rapide : la caméra chauffe pendant que Flask démarre
+    if config.get('fast_start', True):
+        start_fast_boot()
+    
     # Démarrer l'application Flask
     app.run(host='0.0.0.0', port=5000, debug=False)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Capture pré-armée, synchronisée sur le compte à rebours
+- arm : le navigateur annonce le compte à rebours, le serveur fixe l'échéance
+  (horloge monotone) et renvoie le temps restant ; le navigateur cale l'affichage
+  du « 0 » sur cette échéance (moitié du temps aller-retour déduite)
+- Pendant l'attente, le flux vidéo dépose ses frames horodatées dans un petit
+  tampon ; la première frame après l'échéance déclenche le choix de la frame la
+  plus proche de l'échéance (écart <= une demi-frame si le flux tourne)
+- fire : le navigateur récupère la frame choisie et l'écart mesuré
+"""
+
+import threading
+import time
+import uuid
+
+# Arms non réclamés oubliés après ce délai au-delà de leur échéance (s)
+ARM_EXPIRY_SECONDS = 30
+# Compte à rebours maximal accepté (s)
+MAX_COUNTDOWN_SECONDS = 30
+
+
+class ArmedShot:
+    """Une capture armée : échéance, frame retenue et écart mesuré"""
+
+    def __init__(self, booth_id, deadline):
+        self.id = uuid.uuid4().hex[:12]
+        self.booth_id = booth_id
+        self.deadline = deadline
+        self.previous = None  # (horodatage, jpeg) de la dernière frame avant l'échéance
+        self.frame = None
+        self.frame_timestamp = None
+        self._ready = threading.Event()
+
+    @property
+    def skew(self):
+        """Écart (s) entre l'horodatage de la frame retenue et l'échéance"""
+        if self.frame_timestamp is None:
+            return None
+        return self.frame_timestamp - self.deadline
+
+    def remaining(self, now=None):
+        now = time.monotonic() if now is None else now
+        return self.deadline - now
+
+    def offer(self, jpeg_frame, timestamp):
+        """Frame du flux : mémoriser avant l'échéance, choisir à la première après"""
+        if self._ready.is_set():
+            return
+        if timestamp < self.deadline:
+            self.previous = (timestamp, jpeg_frame)
+            return
+        chosen = (timestamp, jpeg_frame)
+        if self.previous is not None and self.deadline - self.previous[0] < timestamp - self.deadline:
+            chosen = self.previous
+        self.frame_timestamp, self.frame = chosen
+        self.previous = None
+        self._ready.set()
+
+    def wait(self, timeout):
+        """Attendre la frame retenue, retourne False si le flux n'en a pas fourni"""
+        return self._ready.wait(timeout)
+
+
+class ArmedCaptureStore:
+    """Captures armées en attente, alimentées par le flux vidéo"""
+
+    def __init__(self):
+        self._shots = {}
+        self._lock = threading.Lock()
+
+    def arm(self, booth_id, countdown_seconds):
+        """Armer une capture pour booth_id (remplace celle qu'elle avait déjà armée)"""
+        countdown_seconds = max(0.0, min(float(countdown_seconds), MAX_COUNTDOWN_SECONDS))
+        shot = ArmedShot(booth_id, time.monotonic() + countdown_seconds)
+        with self._lock:
+            # Copie sur écriture : feed() parcourt les captures sans verrou
+            now = time.monotonic()
+            shots = {key: value for key, value in self._shots.items()
+                     if now - value.deadline < ARM_EXPIRY_SECONDS and value.booth_id != booth_id}
+            shots[shot.id] = shot
+            self._shots = shots
+        return shot
+
+    def get(self, shot_id, booth_id):
+        """Capture armée par booth_id (None si inconnue, expirée ou d'une autre borne)"""
+        shot = self._shots.get(shot_id)
+        if shot is None or shot.booth_id != booth_id:
+            return None
+        return shot
+
+    def discard(self, shot_id):
+        """Oublier une capture une fois sa frame récupérée"""
+        with self._lock:
+            if shot_id in self._shots:
+                shots = dict(self._shots)
+                del shots[shot_id]
+                self._shots = shots
+
+    def feed(self, jpeg_frame, timestamp):
+        """Appelé par le flux vidéo pour chaque frame (sans effet si rien n'est armé)"""
+        shots = self._shots
+        if not shots:
+            return
+        for shot in shots.values():
+            shot.offer(jpeg_frame, timestamp)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark de optimize_image() : décodage pleine taille + LANCZOS (ancien chemin)
+contre décodage JPEG réduit (draft) + redimensionnement bilinéaire (chemin rapide)
+
+Pour chaque résolution source, mesure la durée décodage + redimensionnement (ms)
+et le pic de mémoire (augmentation du RSS maximal, Ko) dans un processus neuf
+par mesure, puis écrit le résultat en JSON.
+
+Usage:
+  python3 benchmarks/bench_image_decode.py
+  python3 benchmarks/bench_image_decode.py --hd --output decode.json
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, APP_DIR)
+
+RESOLUTIONS = ((640, 480), (1280, 720), (1920, 1080), (2304, 1296), (4608, 2592))
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Benchmark décodage + redimensionnement')
+    parser.add_argument('--hd', action='store_true',
+                        help='Largeur haute densité (384 px au lieu de 192)')
+    parser.add_argument('--repeats', type=int, default=10,
+                        help='Répétitions par résolution (défaut: 10)')
+    parser.add_argument('--output', type=str,
+                        help='Fichier JSON de sortie (défaut: stdout)')
+    return parser.parse_args()
+
+
+def legacy_optimize_image(img_path, high_density=False):
+    """optimize_image() d'origine : pleine taille, niveaux de gris puis LANCZOS"""
+    from PIL import Image
+    img = Image.open(img_path).convert('L')
+    original_width, original_height = img.size
+    max_width = 384 if high_density else 192
+    if original_width > max_width:
+        ratio = max_width / original_width
+        img = img.resize((max_width, int(original_height * ratio)), Image.Resampling.LANCZOS)
+    elif high_density:
+        img = img.resize((original_width, original_height), Image.Resampling.LANCZOS)
+    return img
+
+
+def fast_optimize_image(img_path, high_density=False):
+    from ScriptPythonPOS import optimize_image
+    return optimize_image(img_path, high_density)
+
+
+def make_source(path, width, height):
+    """Photo synthétique avec détails fins (taille de fichier réaliste)"""
+    from PIL import Image, ImageDraw
+    img = Image.new('RGB', (width, height))
+    draw = ImageDraw.Draw(img)
+    for x in range(0, width, 16):
+        draw.line([(x, 0), (width - x, height)], fill=(x % 256, (x * 3) % 256, 255 - x % 256), width=3)
+    for y in range(0, height, 24):
+        draw.ellipse([y % width, y, y % width + 80, y + 60], outline=(255, 255, 255))
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=85)
+    with open(path, 'wb') as f:
+        f.write(buffer.getvalue())
+
+
+def measure(method, img_path, high_density, repeats):
+    """Exécuté dans un processus neuf : durées (ms) et pic mémoire (Ko)"""
+    func = legacy_optimize_image if method == 'legacy' else fast_optimize_image
+    # Mêmes imports pour les deux chemins avant la référence mémoire
+    import PIL.Image  # noqa: F401
+    import ScriptPythonPOS  # noqa: F401
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    durations = []
+    output_size = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        img = func(img_path, high_density)
+        img.load()
+        durations.append((time.perf_counter() - start) * 1000)
+        output_size = img.size
+        del img
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return durations, peak_kb - baseline_kb, output_size
+
+
+def run_isolated(method, img_path, high_density, repeats):
+    # Un processus neuf par mesure : le RSS maximal ne reflète que le chemin testé
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1) as pool:
+        durations, peak_kb, output_size = pool.apply(measure, (method, img_path, high_density, repeats))
+    return {
+        'decode_resize_ms': {
+            'median': statistics.median(durations),
+            'min': min(durations),
+            'max': max(durations),
+        },
+        'peak_memory_kb': peak_kb,
+        'output_size': list(output_size),
+    }
+
+
+def main():
+    args = parse_arguments()
+    workdir = tempfile.mkdtemp(prefix='simplebooth-decode-')
+    results = {'meta': {'high_density': args.hd, 'repeats': args.repeats}, 'resolutions': []}
+    try:
+        for width, height in RESOLUTIONS:
+            img_path = os.path.join(workdir, f'source_{width}x{height}.jpg')
+            make_source(img_path, width, height)
+            entry = {'source': f'{width}x{height}', 'file_kb': os.path.getsize(img_path) / 1024}
+            for method in ('legacy', 'fast'):
+                entry[method] = run_isolated(method, img_path, args.hd, args.repeats)
+            entry['speedup'] = (entry['legacy']['decode_resize_ms']['median']
+                                / entry['fast']['decode_resize_ms']['median'])
+            results['resolutions'].append(entry)
+    finally:
+        for filename in os.listdir(workdir):
+            os.remove(os.path.join(workdir, filename))
+        os.rmdir(workdir)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Périphériques simulés pour les benchmarks SimpleBooth
+- Flux MJPEG synthétique (lu par le backend caméra 'replay')
+- Imprimante série sur pseudo-terminal qui consomme au rythme du baudrate
+  et répond à la requête d'état papier (DLE EOT 4) de ScriptPythonPOS.py
+"""
+
+import io
+import os
+import pty
+import select
+import threading
+import time
+import tty
+
+from PIL import Image, ImageDraw
+
+
+def make_mjpeg_file(path, frame_count=30, width=1280, height=720, quality=75):
+    """Générer un fichier MJPEG (frames JPEG concaténées) avec du mouvement"""
+    with open(path, 'wb') as f:
+        for index in range(frame_count):
+            img = Image.new('RGB', (width, height), (40, 40, 60))
+            draw = ImageDraw.Draw(img)
+            # Dégradé + barre mobile pour obtenir une taille de frame réaliste
+            for y in range(0, height, 8):
+                shade = int(255 * y / height)
+                draw.rectangle([0, y, width, y + 8], fill=(shade, 80, 255 - shade))
+            x = int(width * index / frame_count)
+            draw.rectangle([x, 0, x + width // 10, height], fill=(255, 255, 255))
+            draw.text((20, 20), f"frame {index}", fill=(0, 0, 0))
+            buffer = io.BytesIO()
+            img.save(buffer, 'JPEG', quality=quality)
+            f.write(buffer.getvalue())
+    return path
+
+
+class PtyPrinter:
+    """Imprimante thermique simulée : un pty dont on lit les octets à la vitesse du baudrate"""
+
+    # 8N1 : 10 bits transmis par octet
+    BITS_PER_BYTE = 10
+    # Requête d'état papier ESC/POS et réponses (capteur : papier présent / absent)
+    PAPER_STATUS_QUERY = b'\x10\x04\x04'
+    PAPER_PRESENT = b'\x12'
+    PAPER_OUT = b'\x72'
+
+    def __init__(self, baudrate=9600):
+        self.baudrate = baudrate
+        self.master_fd, self.slave_fd = pty.openpty()
+        tty.setraw(self.slave_fd)
+        self.port = os.ttyname(self.slave_fd)
+        self.bytes_received = 0
+        self.last_byte_time = None
+        self.has_paper = True
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._consume, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=2)
+        for fd in (self.master_fd, self.slave_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def reset(self):
+        with self._lock:
+            self.bytes_received = 0
+            self.last_byte_time = None
+
+    def _consume(self):
+        byte_time = self.BITS_PER_BYTE / self.baudrate
+        # Lire par petits blocs pour que le pty se remplisse et bloque l'émetteur
+        chunk_size = max(1, self.baudrate // self.BITS_PER_BYTE // 100)
+        next_deadline = time.monotonic()
+        while self._running:
+            try:
+                ready, _, _ = select.select([self.master_fd], [], [], 0.1)
+            except (OSError, ValueError):
+                return
+            if not ready:
+                next_deadline = time.monotonic()
+                continue
+            try:
+                data = os.read(self.master_fd, chunk_size)
+            except OSError:
+                return
+            if not data:
+                continue
+            # La requête arrive seule, port au repos : elle ouvre toujours le bloc lu
+            if data.startswith(self.PAPER_STATUS_QUERY):
+                os.write(self.master_fd, self.PAPER_PRESENT if self.has_paper else self.PAPER_OUT)
+            next_deadline = max(next_deadline, time.monotonic()) + len(data) * byte_time
+            delay = next_deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            with self._lock:
+                self.bytes_received += len(data)
+                self.last_byte_time = time.perf_counter()
+
+    def wait_idle(self, idle_seconds=0.5, timeout=120):
+        """Attendre que plus aucun octet n'arrive, retourne l'heure du dernier octet"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                last = self.last_byte_time
+            if last is not None and time.perf_counter() - last >= idle_seconds:
+                return last
+            time.sleep(0.05)
+        return self.last_byte_time
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark de bout en bout de SimpleBooth
+Démarre l'application avec une caméra MJPEG simulée (backend 'replay') et une
+imprimante série sur pseudo-terminal, puis mesure :
+- fps du flux vidéo par spectateur
+- latence de /capture
+- temps de la page /photos pour 100 / 1k / 10k photos, rendu à froid et depuis le cache
+- durée de /print_photo découpée en décodage, raster et transfert
+
+Les résultats sont écrits en JSON pour comparaison entre versions.
+
+Usage:
+  python3 benchmarks/run_benchmarks.py
+  python3 benchmarks/run_benchmarks.py --output bench.json
+  python3 benchmarks/run_benchmarks.py --replay-file enregistrement.mjpeg --photo-counts 100,1000
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, APP_DIR)
+
+from fake_devices import make_mjpeg_file, PtyPrinter
+from capture_sessions import BOOTH_HEADER
+
+# Toutes les requêtes du banc viennent de la même borne (pas de cookie de session)
+BENCH_HEADERS = {BOOTH_HEADER: 'bench'}
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Benchmark de bout en bout SimpleBooth')
+    parser.add_argument('--replay-file', type=str,
+                        help='Flux MJPEG enregistré à rejouer (généré sinon)')
+    parser.add_argument('--fps', type=int, default=15,
+                        help='Framerate de la caméra simulée (défaut: 15)')
+    parser.add_argument('--viewers', type=str, default='1,2,4',
+                        help='Nombres de spectateurs simultanés du flux (défaut: 1,2,4)')
+    parser.add_argument('--stream-seconds', type=float, default=5.0,
+                        help='Durée de mesure du flux par scénario (défaut: 5)')
+    parser.add_argument('--captures', type=int, default=20,
+                        help='Nombre de requêtes /capture (défaut: 20)')
+    parser.add_argument('--photo-counts', type=str, default='100,1000,10000',
+                        help='Tailles de galerie pour /photos (défaut: 100,1000,10000)')
+    parser.add_argument('--page-repeats', type=int, default=5,
+                        help='Nombre de chargements de /photos par taille (défaut: 5)')
+    parser.add_argument('--prints', type=int, default=3,
+                        help='Nombre de requêtes /print_photo (défaut: 3)')
+    parser.add_argument('--baudrate', type=int, default=9600,
+                        help='Baudrate de l\'imprimante simulée (défaut: 9600)')
+    parser.add_argument('--hd', action='store_true',
+                        help='Impression haute densité (print_resolution 576)')
+    parser.add_argument('--output', type=str,
+                        help='Fichier JSON de sortie (défaut: stdout)')
+    return parser.parse_args()
+
+
+def summarize(values):
+    """Statistiques (ms) d'une liste de durées"""
+    if not values:
+        return {'count': 0}
+    ordered = sorted(values)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    return {
+        'count': len(ordered),
+        'mean': statistics.fmean(ordered),
+        'min': ordered[0],
+        'p50': percentile(50),
+        'p95': percentile(95),
+        'max': ordered[-1],
+    }
+
+
+class BenchServer:
+    """Serveur werkzeug multi-thread autour de l'application Flask"""
+
+    def __init__(self, flask_app):
+        from werkzeug.serving import make_server
+        self.server = make_server('127.0.0.1', 0, flask_app, threaded=True)
+        self.port = self.server.server_port
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+    def request(self, method, path, timeout=120):
+        """Requête simple, retourne (durée ms, statut, corps)"""
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=timeout)
+        start = time.perf_counter()
+        conn.request(method, path, headers=BENCH_HEADERS)
+        response = conn.getresponse()
+        body = response.read()
+        elapsed = (time.perf_counter() - start) * 1000
+        conn.close()
+        return elapsed, response.status, body
+
+
+class StreamViewer(threading.Thread):
+    """Client /video_stream qui compte les frames reçues"""
+
+    def __init__(self, port, duration):
+        super().__init__(daemon=True)
+        self.port = port
+        self.duration = duration
+        self.frames = 0
+        self.first_frame_ms = None
+        self.error = None
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=10)
+        try:
+            start = time.perf_counter()
+            conn.request('GET', '/video_stream', headers=BENCH_HEADERS)
+            response = conn.getresponse()
+            end = start + self.duration
+            while time.perf_counter() < end and not self._stop_event.is_set():
+                line = response.readline()
+                if not line:
+                    break
+                if line == b'--frame\r\n':
+                    if self.first_frame_ms is None:
+                        self.first_frame_ms = (time.perf_counter() - start) * 1000
+                    self.frames += 1
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            conn.close()
+
+
+def bench_stream(server, viewer_counts, duration):
+    results = []
+    for count in viewer_counts:
+        viewers = [StreamViewer(server.port, duration) for _ in range(count)]
+        for viewer in viewers:
+            viewer.start()
+        for viewer in viewers:
+            viewer.join(duration + 10)
+        results.append({
+            'viewers': count,
+            'fps_per_viewer': [viewer.frames / duration for viewer in viewers],
+            'first_frame_ms': [viewer.first_frame_ms for viewer in viewers],
+            'errors': [viewer.error for viewer in viewers if viewer.error],
+        })
+        # Laisser le serveur fermer les générateurs du scénario
+        time.sleep(0.5)
+    return results
+
+
+def bench_capture(server, count):
+    # Un spectateur actif pour que le fallback sur la dernière frame fonctionne
+    viewer = StreamViewer(server.port, 3600)
+    viewer.start()
+    deadline = time.monotonic() + 10
+    while viewer.frames == 0 and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    durations = []
+    failures = 0
+    for _ in range(count):
+        elapsed, status, body = server.request('POST', '/capture')
+        if status == 200 and json.loads(body).get('success'):
+            durations.append(elapsed)
+        else:
+            failures += 1
+    viewer.stop()
+    viewer.join(5)
+    return {'latency_ms': summarize(durations), 'failures': failures}
+
+
+def fill_photos(photos_folder, count, sample):
+    """Ajuster le dossier photos pour qu'il contienne exactement count photos"""
+    existing = sorted(f for f in os.listdir(photos_folder) if f.startswith('bench_'))
+    for filename in existing[count:]:
+        os.remove(os.path.join(photos_folder, filename))
+    for index in range(len(existing), count):
+        with open(os.path.join(photos_folder, f'bench_{index:06d}.jpg'), 'wb') as f:
+            f.write(sample)
+
+
+def bench_photos(server, photos_folder, counts, repeats, sample, invalidate):
+    """/photos rendue à froid (cache invalidé avant chaque essai) puis servie par le cache"""
+    results = []
+    for count in counts:
+        for filename in os.listdir(photos_folder):
+            if not filename.startswith('bench_'):
+                os.remove(os.path.join(photos_folder, filename))
+        fill_photos(photos_folder, count, sample)
+        cold = []
+        cached = []
+        size = 0
+        for _ in range(repeats):
+            # Nouvelle version de la photothèque : le premier chargement refait le rendu
+            invalidate()
+            for durations in (cold, cached):
+                elapsed, status, body = server.request('GET', '/photos')
+                if status == 200:
+                    durations.append(elapsed)
+                    size = len(body)
+        results.append({'photos': count, 'cold_ms': summarize(cold), 'cached_ms': summarize(cached),
+                        'page_bytes': size})
+    fill_photos(photos_folder, 0, sample)
+    return results
+
+
+def bench_print(server, printer, count):
+    walls = []
+    phases = {'connect_ms': [], 'decode_ms': [], 'raster_ms': [], 'transfer_ms': []}
+    drains = []
+    errors = []
+    for _ in range(count):
+        # Nouvelle capture pour disposer d'une photo courante
+        viewer = StreamViewer(server.port, 3600)
+        viewer.start()
+        while viewer.frames == 0 and viewer.is_alive():
+            time.sleep(0.05)
+        server.request('POST', '/capture')
+        viewer.stop()
+        viewer.join(5)
+
+        printer.reset()
+        start = time.perf_counter()
+        elapsed, status, body = server.request('POST', '/print_photo', timeout=600)
+        result = json.loads(body) if status == 200 else {}
+        if not result.get('success'):
+            errors.append(result.get('error', f'HTTP {status}'))
+            continue
+        walls.append(elapsed)
+        for key, value in result.get('timings', {}).items():
+            phases.setdefault(key, []).append(value)
+        # Temps jusqu'à ce que l'imprimante simulée ait consommé le dernier octet
+        last_byte = printer.wait_idle()
+        if last_byte is not None:
+            drains.append((last_byte - start) * 1000)
+
+    return {
+        'wall_ms': summarize(walls),
+        'phases_ms': {key: summarize(values) for key, values in phases.items()},
+        'printer_drain_ms': summarize(drains),
+        'bytes_per_print': printer.bytes_received,
+        'errors': errors,
+    }
+
+
+def main():
+    args = parse_arguments()
+    workdir = tempfile.mkdtemp(prefix='simplebooth-bench-')
+    printer = PtyPrinter(args.baudrate).start()
+    try:
+        replay_file = os.path.join(workdir, 'replay.mjpeg')
+        if args.replay_file:
+            shutil.copy(args.replay_file, replay_file)
+        else:
+            make_mjpeg_file(replay_file, frame_count=args.fps * 2)
+
+        config = {
+            'footer_text': 'Benchmark',
+            'timer_seconds': 3,
+            'printer_enabled': True,
+            'printer_port': printer.port,
+            'printer_baudrate': args.baudrate,
+            'print_resolution': 576 if args.hd else 384,
+            'camera_backend': 'replay',
+            'camera_replay_file': replay_file,
+            'camera_framerate': args.fps,
+        }
+        with open(os.path.join(workdir, 'config.json'), 'w', encoding='utf-8') as f:
+            json.dump(config, f, indent=2)
+
+        # L'application lit config.json et photos/ dans le répertoire courant
+        os.chdir(workdir)
+        import app as simplebooth
+
+        with open(replay_file, 'rb') as f:
+            from camera_backends import split_jpeg_frames
+            sample = split_jpeg_frames(f.read())[0][0]
+
+        server = BenchServer(simplebooth.app).start()
+        results = {
+            'meta': {
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'platform': platform.platform(),
+                'camera_fps': args.fps,
+                'printer_baudrate': args.baudrate,
+                'print_hd': args.hd,
+            },
+            'stream': bench_stream(server, [int(v) for v in args.viewers.split(',')], args.stream_seconds),
+            'capture': bench_capture(server, args.captures),
+            'photos': bench_photos(server, os.path.abspath(simplebooth.PHOTOS_FOLDER),
+                                   [int(v) for v in args.photo_counts.split(',')],
+                                   args.page_repeats, sample, simplebooth.page_cache.bump_library),
+            'print': bench_print(server, printer, args.prints),
+        }
+        server.stop()
+    finally:
+        printer.stop()
+        os.chdir(APP_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Superviseur de la source caméra
+- Un seul thread lit le backend et publie chaque frame ; les navigateurs ne
+  démarrent ni n'arrêtent plus la caméra eux-mêmes (plus de course sur l'arrêt)
+- Chien de garde : aucune frame pendant stall_timeout (startup_timeout juste
+  après un démarrage) -> la source est arrêtée puis relancée
+- Relances espacées par un délai exponentiel, remis à zéro après une période stable
+- Compteur de relances et temps de rétablissement (dernière frame avant la
+  panne -> première frame après la relance)
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Délais entre relances consécutives (s)
+BACKOFF_INITIAL = 0.25
+BACKOFF_MAX = 10.0
+# Durée de fonctionnement sans panne qui remet le délai de relance à zéro (s)
+STABLE_SECONDS = 10.0
+# Période de vérification du chien de garde (s)
+WATCHDOG_INTERVAL = 0.1
+
+
+class CameraSupervisor:
+    """Cycle de vie de la source caméra : démarrage, surveillance, relance"""
+
+    def __init__(self, backend, on_frame=None, on_restart=None, on_recovered=None,
+                 stall_timeout=1.0, startup_timeout=5.0):
+        self.backend = backend
+        # on_frame(jpeg, horodatage) dans le thread lecteur, pour chaque frame
+        self.on_frame = on_frame
+        # on_restart(raison) à chaque relance, on_recovered(secondes) à la frame qui suit
+        self.on_restart = on_restart
+        self.on_recovered = on_recovered
+        self.stall_timeout = stall_timeout
+        self.startup_timeout = startup_timeout
+        self.state = 'stopped'  # stopped | starting | running | backoff
+        self.viewers = 0
+        self.restarts = 0
+        self.last_restart_reason = None
+        self.last_recovery_seconds = None
+        self.last_diagnostics = []
+        self._frame = None  # (numéro, jpeg, horodatage)
+        self._sequence = 0
+        self._started_at = None
+        self._last_frame_at = None
+        self._failed_at = None
+        self._failures = 0
+        self._stall_reason = None
+        # Numéro de la tentative en cours : le chien de garde ne vise que celle qu'il a vue
+        self._generation = 0
+        self._stalled_generation = None
+        # Sérialise démarrage/arrêt du backend entre lecteur, chien de garde et stop()
+        self._backend_lock = threading.Lock()
+        self._condition = threading.Condition()
+        self._lifecycle_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._threads = []
+
+    @property
+    def active(self):
+        """Source voulue en marche (démarrée et pas arrêtée depuis)"""
+        return bool(self._threads) and not self._stop_event.is_set()
+
+    def start(self):
+        """Démarrer la supervision (idempotent)"""
+        with self._lifecycle_lock:
+            self._start_locked()
+
+    def stop(self):
+        """Arrêter la source et attendre la fin des threads (idempotent)"""
+        with self._lifecycle_lock:
+            self._stop_locked()
+
+    def acquire(self):
+        """Un spectateur de plus : la source tourne tant qu'il en reste un"""
+        with self._lifecycle_lock:
+            self.viewers += 1
+            self._start_locked()
+
+    def release(self):
+        with self._lifecycle_lock:
+            self.viewers = max(0, self.viewers - 1)
+            if self.viewers == 0:
+                self._stop_locked()
+
+    def _start_locked(self):
+        if self.active:
+            return
+        # Threads d'une supervision arrêtée par le chien de garde ou une erreur
+        self._stop_locked()
+        self._stop_event.clear()
+        self._failures = 0
+        self._threads = [
+            threading.Thread(target=self._run, name='camera-reader', daemon=True),
+            threading.Thread(target=self._watch, name='camera-watchdog', daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _stop_locked(self):
+        if not self._threads:
+            return
+        # L'événement d'abord : un démarrage concurrent du backend le verra et s'annulera
+        self._stop_event.set()
+        self._stop_backend()
+        with self._condition:
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+        self._frame = None
+        self.state = 'stopped'
+
+    def next_frame(self, after=None, timeout=1.0):
+        """Frame publiée après le numéro after : (numéro, jpeg, horodatage) ou None"""
+        with self._condition:
+            self._condition.wait_for(
+                lambda: (self._frame is not None and self._frame[0] != after)
+                or self._stop_event.is_set(),
+                timeout)
+            frame = self._frame
+        if frame is None or frame[0] == after:
+            return None
+        return frame
+
+    def _stop_backend(self):
+        with self._backend_lock:
+            self._stop_backend_locked()
+
+    def _stop_backend_locked(self):
+        try:
+            self.backend.stop()
+        except Exception as e:
+            logger.info(f"[CAMERA] Erreur arrêt caméra: {e}")
+
+    def _run(self):
+        # Seul ce thread écrit self.state (hors stop() une fois les threads terminés)
+        while not self._stop_event.is_set():
+            reason = 'exit'
+            try:
+                with self._backend_lock:
+                    if self._stop_event.is_set():
+                        # stop() est passé entre la vérification et le démarrage
+                        break
+                    self._generation += 1
+                    self.state = 'starting'
+                    self._started_at = time.monotonic()
+                    self._last_frame_at = None
+                    self._stall_reason = None
+                    self.backend.start()
+                for jpeg_frame in self.backend.frames():
+                    self._publish(jpeg_frame)
+                    if self._stop_event.is_set():
+                        break
+            except Exception as e:
+                reason = 'start_error' if self._last_frame_at is None else 'error'
+                logger.info(f"[CAMERA] Erreur source {self.backend.name}: {e}")
+            if self._stop_event.is_set():
+                break
+            self._failed(self._stall_reason or reason)
+        self._stop_backend()
+
+    def _publish(self, jpeg_frame):
+        now = time.monotonic()
+        timestamp = self.backend.last_timestamp or now
+        if self._failed_at is not None:
+            recovery = now - self._failed_at
+            self._failed_at = None
+            self.last_recovery_seconds = recovery
+            logger.info(f"[CAMERA] Source rétablie en {recovery * 1000:.0f} ms")
+            if self.on_recovered:
+                self.on_recovered(recovery)
+        if self._failures and now - self._started_at > STABLE_SECONDS:
+            self._failures = 0
+        self.state = 'running'
+        self._last_frame_at = now
+        if self.on_frame:
+            self.on_frame(jpeg_frame, timestamp)
+        with self._condition:
+            self._sequence += 1
+            self._frame = (self._sequence, jpeg_frame, timestamp)
+            self._condition.notify_all()
+
+    def _failed(self, reason):
+        """Source tombée : diagnostic, compteurs, puis attente avant relance"""
+        # Arrêt d'abord : le lecteur stderr a fini de lire les dernières lignes
+        self._stop_backend()
+        self.last_diagnostics = self.backend.diagnostics()
+        if self._failed_at is None:
+            # Coupure vue par les spectateurs : depuis la dernière frame reçue
+            self._failed_at = self._last_frame_at or time.monotonic()
+        self.restarts += 1
+        self.last_restart_reason = reason
+        delay = 0.0 if self._failures == 0 else min(BACKOFF_MAX, BACKOFF_INITIAL * 2 ** (self._failures - 1))
+        self._failures += 1
+        logger.info(f"[CAMERA] Source {self.backend.name} tombée ({reason}), relance dans {delay:.2f}s")
+        for line in self.last_diagnostics[-5:]:
+            logger.info(f"[CAMERA] STDERR: {line}")
+        if self.on_restart:
+            self.on_restart(reason)
+        self.state = 'backoff'
+        self._stop_event.wait(delay)
+
+    def _watch(self):
+        while not self._stop_event.wait(WATCHDOG_INTERVAL):
+            with self._backend_lock:
+                # Tentative déjà signalée, ou _run entre deux tentatives
+                if self.state not in ('starting', 'running') or self._stalled_generation == self._generation:
+                    continue
+                now = time.monotonic()
+                if self._last_frame_at is None:
+                    silent, limit, reason = now - self._started_at, self.startup_timeout, 'startup_timeout'
+                else:
+                    silent, limit, reason = now - self._last_frame_at, self.stall_timeout, 'stall'
+                if silent <= limit:
+                    continue
+                logger.info(f"[CAMERA] Aucune frame depuis {silent * 1000:.0f} ms, arrêt de la source")
+                self._stall_reason = reason
+                self._stalled_generation = self._generation
+                # Débloque la lecture en cours : frames() se termine et _run relance.
+                # Sous le verrou : _run ne peut pas démarrer la tentative suivante entre-temps
+                self._stop_backend_locked()
+
+    def snapshot(self):
+        last_frame_age = None
+        if self._last_frame_at is not None:
+            last_frame_age = round((time.monotonic() - self._last_frame_at) * 1000)
+        return {
+            'backend': self.backend.name,
+            'timestamp_source': self.backend.timestamp_source,
+            'latency_ms': round(self.backend.latency * 1000),
+            'state': self.state,
+            'viewers': self.viewers,
+            'restarts': self.restarts,
+            'last_restart_reason': self.last_restart_reason,
+            'last_recovery_ms': (round(self.last_recovery_seconds * 1000)
+                                 if self.last_recovery_seconds is not None else None),
+            'last_frame_age_ms': last_frame_age,
+            'diagnostics': self.last_diagnostics[-10:],
+        }
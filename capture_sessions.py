@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+État de capture par client (kiosque, tablette admin, autre borne)
+- Chaque navigateur reçoit un identifiant de borne stocké dans son cookie de session
+  (ou fourni explicitement via l'en-tête X-Booth-Id / le paramètre booth)
+- Les lectures ne prennent aucun verrou : le dictionnaire est remplacé en entier
+  à chaque écriture (copie sur écriture), les lecteurs voient un instantané cohérent
+"""
+
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+from flask import request, session
+
+CaptureState = namedtuple('CaptureState', ['photo', 'updated'])
+
+BOOTH_HEADER = 'X-Booth-Id'
+
+
+def current_booth_id(create=True):
+    """Identifiant de la borne à l'origine de la requête (None si inconnue et create=False)"""
+    booth_id = request.headers.get(BOOTH_HEADER) or request.args.get('booth')
+    if booth_id:
+        return booth_id[:64]
+    booth_id = session.get('booth_id')
+    if booth_id is None and create:
+        booth_id = session['booth_id'] = uuid.uuid4().hex[:12]
+    return booth_id
+
+
+class CaptureSessionStore:
+    """Photo courante de chaque borne"""
+
+    def __init__(self, max_booths=256):
+        self.max_booths = max_booths
+        self._states = {}
+        self._write_lock = threading.Lock()
+
+    def get_photo(self, booth_id):
+        """Photo courante de la borne (lecture sans verrou)"""
+        state = self._states.get(booth_id)
+        return state.photo if state else None
+
+    def set_photo(self, booth_id, photo):
+        with self._write_lock:
+            states = dict(self._states)
+            if photo is None:
+                states.pop(booth_id, None)
+            else:
+                states[booth_id] = CaptureState(photo, time.time())
+                # Oublier les bornes inactives depuis le plus longtemps
+                if len(states) > self.max_booths:
+                    oldest = sorted(states, key=lambda key: states[key].updated)
+                    for key in oldest[:len(states) - self.max_booths]:
+                        del states[key]
+            self._states = states
+
+    def forget_photo(self, photo):
+        """Retirer une photo supprimée de toutes les bornes qui la référencent"""
+        with self._write_lock:
+            if not any(state.photo == photo for state in self._states.values()):
+                return
+            self._states = {key: state for key, state in self._states.items() if state.photo != photo}
+
+    def clear(self):
+        with self._write_lock:
+            self._states = {}
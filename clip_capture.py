@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Clips animés (GIF / WebP, boomerang) à partir des frames de l'aperçu MJPEG
+- Le flux vidéo passe chaque frame à ClipRecorder.feed() : simple ajout dans un
+  tampon borné tant qu'un enregistrement est en cours, rien sinon
+- L'encodage part dans un processus séparé (ce script lancé par subprocess,
+  un clip à la fois) : ni le flux ni les workers web n'attendent la compression,
+  et le processus d'encodage n'importe jamais app.py
+- GIF : palette calculée une seule fois sur un échantillon des frames, puis
+  différence de frames (pixels inchangés -> index transparent) pour que LZW
+  ne réencode que ce qui bouge
+"""
+
+import io
+import json
+import logging
+import os
+import pickle
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageChops, features
+
+from image_utils import FAST_RESAMPLE, draft_for_size
+
+logger = logging.getLogger(__name__)
+
+CLIP_FORMATS = ('gif', 'webp')
+CLIP_EXTENSIONS = tuple(f'.{fmt}' for fmt in CLIP_FORMATS)
+
+# Index de palette réservé aux pixels inchangés depuis la frame précédente
+TRANSPARENT_INDEX = 255
+# Écart de luminance en dessous duquel un pixel est considéré inchangé (bruit capteur)
+DIFF_THRESHOLD = 12
+# Frames utilisées pour calculer la palette commune
+PALETTE_SAMPLES = 6
+# Durée maximale d'un clip (s) : borne la mémoire du tampon
+MAX_CLIP_SECONDS = 6
+
+
+def _decode_frame(jpeg_bytes, width):
+    """Frame JPEG décodée directement à la largeur d'affichage"""
+    img = Image.open(io.BytesIO(jpeg_bytes))
+    width = min(width, img.width)
+    height = max(1, img.height * width // img.width)
+    draft_for_size(img, (width, height), 'RGB')
+    img = img.convert('RGB')
+    if img.size != (width, height):
+        img = img.resize((width, height), FAST_RESAMPLE)
+    return img
+
+
+def _shared_palette(frames):
+    """Palette de 255 couleurs calculée une fois sur un échantillon des frames"""
+    step = max(1, len(frames) // PALETTE_SAMPLES)
+    samples = frames[::step][:PALETTE_SAMPLES]
+    width, height = samples[0].size
+    strip = Image.new('RGB', (width, height * len(samples)))
+    for index, frame in enumerate(samples):
+        strip.paste(frame, (0, index * height))
+    # 255 couleurs : l'index 255 reste libre pour la transparence
+    return strip.quantize(colors=TRANSPARENT_INDEX, method=Image.Quantize.MEDIANCUT)
+
+
+def _encode_gif(frames, output_path, frame_ms):
+    palette = _shared_palette(frames)
+    indexed = []
+    previous = None
+    for frame in frames:
+        current = frame.quantize(palette=palette, dither=Image.Dither.NONE)
+        if previous is not None:
+            # Pixels quasi identiques à la frame précédente -> transparents
+            diff = ImageChops.difference(frame, previous).convert('L')
+            unchanged = diff.point(lambda value: 255 if value < DIFF_THRESHOLD else 0)
+            current.paste(TRANSPARENT_INDEX, mask=unchanged)
+            current.info['transparency'] = TRANSPARENT_INDEX
+        indexed.append(current)
+        # Référence = ce qui est réellement affiché (frame précédente là où transparent)
+        previous = frame if previous is None else Image.composite(previous, frame, unchanged)
+    indexed[0].save(output_path, format='GIF', save_all=True, append_images=indexed[1:],
+                    duration=frame_ms, loop=0, disposal=1, transparency=TRANSPARENT_INDEX,
+                    optimize=False)
+
+
+def _encode_webp(frames, output_path, frame_ms):
+    # libwebp fait lui-même la différence entre frames (sous-rectangles, mélange)
+    frames[0].save(output_path, format='WEBP', save_all=True, append_images=frames[1:],
+                   duration=frame_ms, loop=0, quality=75, method=4, minimize_size=True)
+
+
+def encode_clip(jpeg_frames, output_path, width, fmt, boomerang, frame_ms):
+    """Exécuté dans le processus d'encodage : décodage, encodage et écriture du clip, retourne les durées"""
+    start = time.perf_counter()
+    frames = [_decode_frame(jpeg, width) for jpeg in jpeg_frames]
+    decoded = time.perf_counter()
+    if boomerang and len(frames) > 2:
+        # Aller puis retour, sans répéter les extrémités
+        frames = frames + frames[-2:0:-1]
+    temp_path = output_path + '.tmp'
+    if fmt == 'webp':
+        _encode_webp(frames, temp_path, frame_ms)
+    else:
+        _encode_gif(frames, temp_path, frame_ms)
+    # Rendre le clip visible dans la galerie seulement une fois complet
+    os.replace(temp_path, output_path)
+    return {
+        'decode_ms': round((decoded - start) * 1000, 1),
+        'encode_ms': round((time.perf_counter() - decoded) * 1000, 1),
+        'frames': len(frames),
+        'size_kb': round(os.path.getsize(output_path) / 1024, 1),
+    }
+
+
+def run_encoder(jpeg_frames, output_path, width, fmt, boomerang, frame_ms):
+    """Encoder un clip dans un processus Python séparé (ce script), retourne les durées"""
+    payload = pickle.dumps((jpeg_frames, output_path, width, fmt, boomerang, frame_ms))
+    # Même répertoire courant : output_path peut être relatif (PHOTOS_FOLDER)
+    result = subprocess.run([sys.executable, os.path.abspath(__file__)], input=payload, capture_output=True)
+    if result.returncode != 0:
+        stderr = result.stderr.decode('utf-8', 'replace').strip().splitlines()
+        raise RuntimeError(stderr[-1] if stderr else f'Encodeur terminé avec le code {result.returncode}')
+    return json.loads(result.stdout)
+
+
+class ClipJob:
+    """Un clip : enregistrement des frames puis encodage"""
+
+    def __init__(self, seconds, boomerang, output_path, booth_id=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.booth_id = booth_id
+        self.seconds = seconds
+        self.boomerang = boomerang
+        self.output_path = output_path
+        self.filename = os.path.basename(output_path)
+        self.state = 'recording'  # recording | encoding | done | error
+        self.frames = []
+        self.started = time.monotonic()
+        self.deadline = self.started + seconds
+        self.result = None
+        self.error = None
+
+    def snapshot(self):
+        data = {'clip_id': self.id, 'state': self.state, 'filename': self.filename}
+        if self.result:
+            data.update(self.result)
+        if self.error:
+            data['error'] = self.error
+        return data
+
+
+class ClipRecorder:
+    """Enregistrement des frames de l'aperçu et encodage hors des requêtes"""
+
+    def __init__(self, framerate, width=480, fmt='gif', on_done=None, max_jobs=32):
+        if fmt not in CLIP_FORMATS:
+            raise ValueError(f"Format de clip inconnu: {fmt} (attendu: {', '.join(CLIP_FORMATS)})")
+        if fmt == 'webp' and not features.check('webp'):
+            logger.info("[CLIP] WebP indisponible dans Pillow, clips en GIF")
+            fmt = 'gif'
+        self.framerate = framerate
+        self.width = width
+        self.format = fmt
+        self.on_done = on_done
+        self.max_jobs = max_jobs
+        self.jobs = {}
+        self._recording = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='clip-encoder')
+        self._lock = threading.Lock()
+
+    @property
+    def extension(self):
+        return f'.{self.format}'
+
+    def start(self, output_path, seconds, boomerang=False, booth_id=None):
+        """Enregistrer les prochaines secondes de l'aperçu, retourne le ClipJob"""
+        seconds = max(0.5, min(float(seconds), MAX_CLIP_SECONDS))
+        with self._lock:
+            if self._recording is not None:
+                raise RuntimeError('Un clip est déjà en cours d\'enregistrement')
+            job = ClipJob(seconds, boomerang, output_path, booth_id)
+            self.jobs[job.id] = job
+            while len(self.jobs) > self.max_jobs:
+                del self.jobs[next(iter(self.jobs))]
+            self._recording = job
+        # Fin garantie même si le flux s'arrête pendant l'enregistrement
+        timer = threading.Timer(seconds + 1.0, self._finish, args=(job,))
+        timer.daemon = True
+        timer.start()
+        logger.info(f"[CLIP] Enregistrement de {seconds:.1f}s -> {job.filename}")
+        return job
+
+    def feed(self, jpeg_frame, now=None):
+        """Appelé par le flux vidéo pour chaque frame (sans effet hors enregistrement)"""
+        job = self._recording
+        if job is None:
+            return
+        now = time.monotonic() if now is None else now
+        if now < job.deadline and len(job.frames) < int(job.seconds * self.framerate) + 1:
+            job.frames.append(jpeg_frame)
+        else:
+            self._finish(job)
+
+    def _finish(self, job):
+        with self._lock:
+            if self._recording is not job:
+                return
+            self._recording = None
+        frames, job.frames = job.frames, []
+        if not frames:
+            job.state = 'error'
+            job.error = 'Aucune frame reçue (flux vidéo arrêté ?)'
+            logger.info(f"[CLIP] {job.filename}: aucune frame reçue")
+            return
+        job.state = 'encoding'
+        # Garder la vitesse réelle même si le flux a livré moins de frames que prévu
+        frame_ms = max(20, int(job.seconds * 1000 / len(frames)))
+        # Un seul encodeur à la fois : le thread attend le processus, pas le GIL
+        future = self._executor.submit(run_encoder, frames, job.output_path, self.width,
+                                     self.format, job.boomerang, frame_ms)
+        future.add_done_callback(lambda done: self._encoded(job, done))
+
+    def _encoded(self, job, future):
+        try:
+            job.result = future.result()
+            job.state = 'done'
+            logger.info(f"[CLIP] {job.filename}: {job.result['frames']} frames, "
+                        f"{job.result['size_kb']} Ko, encodage {job.result['encode_ms']} ms")
+        except Exception as e:
+            job.state = 'error'
+            job.error = str(e)
+            logger.info(f"[CLIP] Erreur encodage {job.filename}: {e}")
+        if self.on_done:
+            self.on_done(job)
+
+    def get(self, clip_id):
+        return self.jobs.get(clip_id)
+
+    def recorded_by(self, filename, booth_id):
+        """Le clip filename a-t-il été enregistré par booth_id (clips récents seulement)"""
+        return any(job.filename == filename and job.booth_id == booth_id
+                   for job in list(self.jobs.values()))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+def main():
+    """Processus d'encodage : arguments picklés sur stdin, durées en JSON sur stdout"""
+    args = pickle.load(sys.stdin.buffer)
+    try:
+        result = encode_clip(*args)
+    except Exception as e:
+        print(f"Erreur encodage: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
@@ -12,7 +12,30 @@ DEFAULT_CONFIG = {
     'printer_enabled': True,
     'printer_port': '/dev/ttyAMA0',
     'printer_baudrate': 9600,
-    'print_resolution': 384
+    # Imprimantes série supplémentaires du pool (en plus de printer_port)
+    'printer_extra_ports': [],
+    'print_resolution': 384,
+    # Source caméra : 'rpicam', 'v4l2' (webcam USB) ou 'replay' (fichier MJPEG)
+    'camera_backend': 'rpicam',
+    'camera_device': '/dev/video0',
+    'camera_replay_file': 'replay.mjpeg',
+    'camera_width': 1280,
+    'camera_height': 720,
+    'camera_framerate': 15,
+    # Sans frame pendant ce délai, la source caméra est relancée
+    'camera_stall_timeout_ms': 1000,
+    # Latence exposition -> réception des frames sans horodatage capteur (rpicam), à calibrer
+    'camera_latency_ms': 0,
+    # Préchauffer caméra, templates et photos dès le lancement
+    'fast_start': True,
+    # Priorité au flux : téléchargements et galerie bornés (débit en Ko/s)
+    'qos_download_concurrency': 2,
+    'qos_download_rate_kbps': 1024,
+    'qos_gallery_concurrency': 4,
+    # Clips animés : durée (s), format ('gif' ou 'webp') et largeur d'affichage
+    'clip_seconds': 3,
+    'clip_format': 'gif',
+    'clip_width': 480
 }
 
 logger = logging.getLogger(__name__)
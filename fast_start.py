@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Démarrage rapide du kiosque
+- Mesure du temps entre le lancement du processus et la première frame servie
+- Exécution des tâches de préchauffage (caméra, templates, photos) en arrière-plan
+"""
+
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_IMPORT_TIME = time.monotonic()
+
+
+def system_uptime():
+    """Secondes écoulées depuis le démarrage du système (None si indisponible)"""
+    try:
+        with open('/proc/uptime', 'r') as f:
+            return float(f.read().split()[0])
+    except (OSError, ValueError):
+        return None
+
+
+def process_age():
+    """Secondes écoulées depuis le lancement du processus"""
+    uptime = system_uptime()
+    try:
+        with open('/proc/self/stat', 'r') as f:
+            # Le nom du processus peut contenir des espaces : découper après ')'
+            fields = f.read().rsplit(')', 1)[1].split()
+        start_ticks = int(fields[19])
+        if uptime is not None:
+            return uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        pass
+    return time.monotonic() - _IMPORT_TIME
+
+
+class BootTimer:
+    """Jalons du démarrage, en secondes depuis le lancement du processus"""
+
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def mark(self, stage):
+        """Enregistrer un jalon (seule la première occurrence compte)"""
+        with self._lock:
+            if stage in self.stages:
+                return False
+            self.stages[stage] = process_age()
+        logger.info(f"[BOOT] {stage}: {self.stages[stage]:.2f} s après le lancement")
+        return True
+
+    def first_frame_served(self):
+        """Jalon principal : première frame envoyée à un navigateur"""
+        if self.mark('first_frame_served'):
+            uptime = system_uptime()
+            if uptime is not None:
+                logger.info(f"[BOOT] Première frame servie {uptime:.2f} s après le démarrage du système")
+
+
+def run_in_background(boot_timer, name, func):
+    """Lancer une tâche de préchauffage dans un thread démon"""
+    def runner():
+        try:
+            func()
+            boot_timer.mark(f'{name}_ready')
+        except Exception as e:
+            logger.warning(f"[BOOT] Échec du préchauffage {name}: {e}")
+
+    thread = threading.Thread(target=runner, name=f'warmup-{name}', daemon=True)
+    thread.start()
+    return thread
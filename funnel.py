@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Parcours invité : compte à rebours -> déclenchement -> révision -> demande d'impression -> impression terminée
+- Chaque session invité reçoit un identifiant
+- Les horodatages des étapes sont gardés dans un anneau borné en mémoire
+  et ajoutés à un journal compact sur disque (une ligne par étape)
+- Les durées entre étapes alimentent les percentiles affichés sur /admin
+
+Le journal est relu au démarrage : un redémarrage du Pi en cours de soirée
+conserve les statistiques de l'événement en cours.
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+FUNNEL_LOG = 'funnel.log'
+
+STAGES = ('countdown_start', 'shutter', 'review_shown', 'print_requested', 'print_finished')
+
+# Segment mesuré entre une étape et la précédente
+SEGMENTS = (
+    ('countdown', 'countdown_start', 'shutter'),
+    ('review', 'shutter', 'review_shown'),
+    ('decision', 'review_shown', 'print_requested'),
+    ('print', 'print_requested', 'print_finished'),
+)
+
+SEGMENT_LABELS = {
+    'countdown': 'Compte à rebours → déclenchement',
+    'review': 'Déclenchement → révision affichée',
+    'decision': 'Révision → demande d\'impression',
+    'print': 'Demande → impression terminée',
+}
+
+
+def percentile(ordered, p):
+    """Percentile au rang le plus proche d'une liste triée"""
+    if not ordered:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class FunnelTracker:
+    """Horodatage des étapes de chaque session invité"""
+
+    def __init__(self, log_path=FUNNEL_LOG, max_sessions=500, max_samples=10000):
+        self.log_path = log_path
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()
+        self.durations = {name: deque(maxlen=max_samples) for name, _, _ in SEGMENTS}
+        self.session_count = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        """Reconstruire l'état de l'événement en cours depuis le journal"""
+        if not os.path.exists(self.log_path):
+            return
+        try:
+            with open(self.log_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) != 3 or parts[2] not in STAGES:
+                        continue
+                    try:
+                        timestamp = float(parts[0])
+                    except ValueError:
+                        continue
+                    self._apply(parts[1], parts[2], timestamp)
+        except OSError as e:
+            logger.warning(f"[FUNNEL] Lecture du journal impossible: {e}")
+
+    def _apply(self, session_id, stage, timestamp):
+        """Enregistrer une étape (verrou déjà pris), retourne False si ignorée"""
+        stages = self.sessions.get(session_id)
+        if stages is None:
+            if stage != 'countdown_start':
+                return False
+            stages = self.sessions[session_id] = {}
+            self.session_count += 1
+            # Anneau borné : oublier les sessions les plus anciennes
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+        if stage in stages:
+            return False
+        stages[stage] = timestamp
+        for name, start_stage, end_stage in SEGMENTS:
+            if end_stage == stage and start_stage in stages:
+                self.durations[name].append(timestamp - stages[start_stage])
+        return True
+
+    def _append_log(self, session_id, stage, timestamp):
+        try:
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(f"{timestamp:.3f} {session_id} {stage}\n")
+        except OSError as e:
+            logger.warning(f"[FUNNEL] Écriture du journal impossible: {e}")
+
+    def start_session(self):
+        """Nouvelle session invité (début du compte à rebours)"""
+        session_id = uuid.uuid4().hex[:12]
+        self.record(session_id, 'countdown_start')
+        return session_id
+
+    def record(self, session_id, stage):
+        """Horodater une étape d'une session connue"""
+        if not session_id or stage not in STAGES:
+            return False
+        timestamp = time.time()
+        with self._lock:
+            recorded = self._apply(session_id, stage, timestamp)
+            if recorded:
+                self._append_log(session_id, stage, timestamp)
+        return recorded
+
+    def reset(self):
+        """Démarrer un nouvel événement : vider l'anneau, les durées et le journal"""
+        with self._lock:
+            self.sessions.clear()
+            for samples in self.durations.values():
+                samples.clear()
+            self.session_count = 0
+            try:
+                if os.path.exists(self.log_path):
+                    os.remove(self.log_path)
+            except OSError as e:
+                logger.warning(f"[FUNNEL] Suppression du journal impossible: {e}")
+
+    def stats(self):
+        """Percentiles p50/p95/p99 (secondes) de chaque segment du parcours"""
+        with self._lock:
+            snapshot = {name: sorted(samples) for name, samples in self.durations.items()}
+            session_count = self.session_count
+        segments = []
+        for name, _, _ in SEGMENTS:
+            ordered = snapshot[name]
+            segments.append({
+                'name': name,
+                'label': SEGMENT_LABELS[name],
+                'count': len(ordered),
+                'p50': percentile(ordered, 50),
+                'p95': percentile(ordered, 95),
+                'p99': percentile(ordered, 99),
+            })
+        return {'sessions': session_count, 'segments': segments}
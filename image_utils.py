@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Chargement d'images réduites au décodage
+- JPEG : draft() demande à libjpeg de décoder directement à 1/2, 1/4 ou 1/8
+  de la taille (mise à l'échelle dans le domaine DCT) et en niveaux de gris,
+  sans jamais allouer l'image pleine résolution
+- Le redimensionnement final ne couvre plus qu'un facteur < 2 : un filtre
+  bilinéaire suffit là où LANCZOS était nécessaire depuis la pleine taille
+
+Utilisé par ScriptPythonPOS.py pour l'impression et pour les vignettes.
+"""
+
+from PIL import Image
+
+# Filtre du redimensionnement final après décodage réduit
+FAST_RESAMPLE = Image.Resampling.BILINEAR
+
+
+def draft_for_size(img, size, mode=None):
+    """Réduire le décodage JPEG à la plus petite échelle couvrant size (sans effet sinon)"""
+    width, height = img.size
+    target_width, target_height = size
+    if target_width >= width and target_height >= height:
+        return img
+    # draft() choisit l'échelle 1/2^n dont le résultat reste >= size
+    img.draft(mode, (max(1, target_width), max(1, target_height)))
+    return img
+
+
+def open_for_width(img_path, max_width, mode='L'):
+    """Ouvrir une image décodée au plus près de max_width, retourne (image, taille d'origine)"""
+    img = Image.open(img_path)
+    original_size = img.size
+    width, height = original_size
+    if width > max_width:
+        draft_for_size(img, (max_width, height * max_width // width), mode)
+    if img.mode != mode:
+        img = img.convert(mode)
+    return img, original_size
+
+
+def make_thumbnail(img_path, max_size, mode='RGB'):
+    """Vignette tenant dans max_size=(largeur, hauteur), par le même chemin rapide"""
+    img = Image.open(img_path)
+    width, height = img.size
+    scale = min(max_size[0] / width, max_size[1] / height, 1.0)
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    draft_for_size(img, size, mode)
+    if img.mode != mode:
+        img = img.convert(mode)
+    if img.size != size:
+        img = img.resize(size, FAST_RESAMPLE)
+    return img
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Cache des pages et fragments rendus (/photos, /admin)
+- Une seule entrée par nom, marquée des versions de la photothèque et de la
+  configuration avec lesquelles elle a été rendue ; remplacée dès qu'elles changent
+- La version de la photothèque est incrémentée par capture et suppression,
+  et combinée à la date de modification du dossier photos (fichiers ajoutés
+  ou supprimés hors de l'application)
+- Réponses servies avec un ETag : un rechargement sans changement reçoit un 304
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+from flask import Response, request
+
+
+class CachedPage:
+    """Rendu conservé en mémoire, déjà encodé en UTF-8 (meta : valeurs calculées avec le rendu)"""
+
+    __slots__ = ('body', 'etag', 'meta')
+
+    def __init__(self, text, meta=None):
+        # Seul l'encodage est gardé : une galerie de 10k photos pèse plusieurs Mo
+        self.body = text.encode('utf-8')
+        self.meta = meta or {}
+        self.etag = hashlib.blake2b(self.body, digest_size=12).hexdigest()
+
+    @property
+    def text(self):
+        """Rendu décodé à la demande (fragment inséré dans une autre page)"""
+        return self.body.decode('utf-8')
+
+
+class PageCache:
+    """Rendus indexés par les versions de la photothèque et de la configuration"""
+
+    def __init__(self, photos_folder):
+        self.photos_folder = photos_folder
+        self.library_version = 0
+        self.config_version = 0
+        self._entries = {}  # nom -> (versions, CachedPage)
+        self._ttl_values = {}
+        self._lock = threading.Lock()
+
+    def bump_library(self):
+        """Photo ajoutée ou supprimée"""
+        with self._lock:
+            self.library_version += 1
+
+    def bump_config(self):
+        """Configuration sauvegardée"""
+        with self._lock:
+            self.config_version += 1
+
+    def _folder_stamp(self):
+        try:
+            return os.stat(self.photos_folder).st_mtime_ns
+        except OSError:
+            return 0
+
+    def versions(self):
+        return (self.library_version, self._folder_stamp(), self.config_version)
+
+    def get_or_render(self, name, render):
+        """Rendu mis en cache pour les versions courantes, render() appelé si absent
+
+        render() retourne le texte rendu, ou directement un CachedPage avec ses meta.
+        """
+        versions = self.versions()
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry[0] == versions:
+                return entry[1]
+        page = render()
+        if not isinstance(page, CachedPage):
+            page = CachedPage(page)
+        with self._lock:
+            # Remplace le rendu d'une version précédente : un seul rendu gardé par nom
+            self._entries[name] = (versions, page)
+        return page
+
+    def get_or_compute(self, name, compute, ttl):
+        """Valeur quelconque conservée ttl secondes (ex: ports série détectés)"""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._ttl_values.get(name)
+            if cached is not None and now - cached[0] < ttl:
+                return cached[1]
+        value = compute()
+        with self._lock:
+            self._ttl_values[name] = (now, value)
+        return value
+
+    def invalidate(self, name):
+        with self._lock:
+            self._ttl_values.pop(name, None)
+
+
+def html_response(page):
+    """Réponse HTML avec ETag, 304 si le navigateur a déjà cette version"""
+    response = Response(page.body, mimetype='text/html')
+    response.set_etag(page.etag)
+    # Revalidation à chaque visite : l'ETag garantit la fraîcheur
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
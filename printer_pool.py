@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Pool d'imprimantes thermiques série
+- Une file et un thread par imprimante
+- Chaque impression part vers l'imprimante la moins chargée qui a du papier
+  (attente estimée = travaux en cours x durée moyenne d'une impression)
+- Une imprimante sans papier ou injoignable passe le travail en échec et ses
+  travaux en attente aux autres ; un travail n'échoue que si aucune imprimante
+  ne reste à essayer
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Code retour de ScriptPythonPOS.py quand il n'y a plus de papier
+NO_PAPER_RETURNCODE = 2
+
+# Durée supposée d'une impression tant qu'aucune n'a été mesurée (57 mm à 9600 bauds)
+DEFAULT_JOB_SECONDS = 15.0
+
+
+class PrintJob:
+    """Impression en attente, terminée par un des workers du pool"""
+
+    def __init__(self, photo_path):
+        self.photo_path = photo_path
+        self.created = time.monotonic()
+        self.tried_ports = []
+        # (code retour, stdout, stderr) de la dernière erreur d'imprimante, hors manque de papier
+        self.last_failure = None
+        self.port = None
+        self.result = None
+        self._done = threading.Event()
+
+    def finish(self, status, returncode=None, stdout='', stderr=''):
+        self.result = {
+            'status': status,
+            'port': self.port,
+            'returncode': returncode,
+            'stdout': stdout,
+            'stderr': stderr,
+        }
+        self._done.set()
+
+    def wait(self, timeout=None):
+        """Attendre la fin de l'impression, retourne le résultat (None si délai dépassé)"""
+        if self._done.wait(timeout):
+            return self.result
+        return None
+
+
+class PrinterWorker:
+    """Une imprimante : sa file, son état de santé et ses compteurs"""
+
+    def __init__(self, pool, port):
+        self.pool = pool
+        self.port = port
+        self.state = 'ok'  # ok | no_paper | error
+        self.queue = deque()
+        self.busy = False
+        self.jobs_done = 0
+        self.jobs_failed = 0
+        self.busy_seconds = 0.0
+        self.consecutive_errors = 0
+        self.last_error = None
+        self.exited = False
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f'printer-{port}', daemon=True)
+        self._thread.start()
+
+    @property
+    def average_job_seconds(self):
+        if self.jobs_done:
+            return self.busy_seconds / self.jobs_done
+        return DEFAULT_JOB_SECONDS
+
+    def estimated_wait(self):
+        """Attente estimée (s) pour un nouveau travail (verrou du pool pris)"""
+        return (len(self.queue) + (1 if self.busy else 0)) * self.average_job_seconds
+
+    def stop(self):
+        self._running = False
+
+    def resume(self):
+        """Reprendre un worker retiré qui n'a pas encore quitté (verrou du pool pris)"""
+        self._running = True
+
+    def _run(self):
+        condition = self.pool.condition
+        while True:
+            with condition:
+                while self._running and not self.queue:
+                    condition.wait()
+                if not self._running:
+                    self.exited = True
+                    return
+                job = self.queue.popleft()
+                self.busy = True
+
+            start = time.monotonic()
+            try:
+                result = self.pool.runner(self.port, job.photo_path)
+                returncode, stdout, stderr = result.returncode, result.stdout, result.stderr
+            except Exception as e:
+                returncode, stdout, stderr = -1, '', str(e)
+            elapsed = time.monotonic() - start
+
+            with condition:
+                self.busy = False
+                if returncode == 0:
+                    self.jobs_done += 1
+                    self.busy_seconds += elapsed
+                    self.consecutive_errors = 0
+                    if self.state == 'error':
+                        self.state = 'ok'
+                    job.finish('success', returncode, stdout, stderr)
+                elif returncode == NO_PAPER_RETURNCODE:
+                    logger.info(f"[PRINTER] {self.port}: plus de papier, bascule des travaux")
+                    self.state = 'no_paper'
+                    job.last_failure = None
+                    self.pool._failover(self, job)
+                else:
+                    self.jobs_failed += 1
+                    self.consecutive_errors += 1
+                    self.last_error = (stderr or '').strip() or f'code {returncode}'
+                    self.state = 'error'
+                    logger.info(f"[PRINTER] {self.port}: erreur ({self.last_error}), bascule des travaux")
+                    job.last_failure = (returncode, stdout, stderr)
+                    self.pool._failover(self, job)
+                condition.notify_all()
+
+    def snapshot(self):
+        return {
+            'port': self.port,
+            'state': self.state,
+            'queued': len(self.queue),
+            'busy': self.busy,
+            'jobs_done': self.jobs_done,
+            'jobs_failed': self.jobs_failed,
+            'average_job_seconds': round(self.average_job_seconds, 2),
+            'jobs_per_minute': round(60.0 / self.average_job_seconds, 2),
+            'last_error': self.last_error,
+        }
+
+
+class PrinterPool:
+    """Répartition des impressions entre plusieurs imprimantes série"""
+
+    def __init__(self, runner, ports=()):
+        # runner(port, photo_path) -> subprocess.CompletedProcess
+        self.runner = runner
+        self.condition = threading.Condition()
+        self.workers = {}
+        # Imprimantes retirées du pool mais encore en train d'imprimer
+        self._retiring = {}
+        self.configure(ports)
+
+    def configure(self, ports):
+        """Ajuster la liste des imprimantes actives"""
+        with self.condition:
+            ports = list(dict.fromkeys(ports))
+            self._retiring = {port: worker for port, worker in self._retiring.items() if not worker.exited}
+            for port in ports:
+                if port in self.workers:
+                    continue
+                worker = self._retiring.pop(port, None)
+                if worker is not None:
+                    # Impression en cours sur ce port : pas de second worker sur le même port série
+                    worker.resume()
+                    self.workers[port] = worker
+                else:
+                    self.workers[port] = PrinterWorker(self, port)
+            for port in list(self.workers):
+                if port not in ports:
+                    worker = self.workers.pop(port)
+                    worker.stop()
+                    self._retiring[port] = worker
+                    orphans = list(worker.queue)
+                    worker.queue.clear()
+                    for job in orphans:
+                        self._dispatch(job)
+            self.condition.notify_all()
+        logger.info(f"[PRINTER] Pool: {', '.join(ports) or 'aucune imprimante'}")
+
+    def _candidates(self, job):
+        available = [w for w in self.workers.values()
+                     if w.state != 'no_paper' and w.port not in job.tried_ports]
+        # Les imprimantes saines d'abord, celles en erreur seulement en dernier recours
+        healthy = [w for w in available if w.state == 'ok']
+        return healthy or available
+
+    def _dispatch(self, job):
+        """Placer un travail dans la file la moins chargée (verrou pris)"""
+        candidates = self._candidates(job)
+        if not candidates:
+            if job.last_failure is not None:
+                # Dernière imprimante essayée en erreur : son message pour l'invité
+                returncode, stdout, stderr = job.last_failure
+                job.finish('error', returncode, stdout, stderr)
+            else:
+                job.finish('no_paper' if self.workers else 'error',
+                           stderr='Plus de papier dans les imprimantes' if self.workers else 'Aucune imprimante active')
+            return None
+        worker = min(candidates, key=lambda w: (w.estimated_wait(), len(w.queue)))
+        job.port = worker.port
+        worker.queue.append(job)
+        self.condition.notify_all()
+        return worker
+
+    def _failover(self, worker, job):
+        """Redistribuer le travail en échec et la file d'une imprimante sans papier ou en erreur (verrou pris)"""
+        job.tried_ports.append(worker.port)
+        pending = [job] + list(worker.queue)
+        worker.queue.clear()
+        for pending_job in pending:
+            self._dispatch(pending_job)
+
+    def submit(self, photo_path):
+        """Ajouter une impression, retourne le PrintJob à attendre"""
+        job = PrintJob(photo_path)
+        with self.condition:
+            self._dispatch(job)
+        return job
+
+    def mark_paper_loaded(self, port):
+        """Remettre une imprimante en service après rechargement du papier"""
+        with self.condition:
+            worker = self.workers.get(port)
+            if worker is None:
+                return False
+            worker.state = 'ok'
+            worker.consecutive_errors = 0
+            self.condition.notify_all()
+            return True
+
+    def has_paper(self):
+        with self.condition:
+            return any(w.state != 'no_paper' for w in self.workers.values())
+
+    def snapshot(self):
+        with self.condition:
+            return [worker.snapshot() for worker in self.workers.values()]
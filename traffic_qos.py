@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Priorités de trafic : le flux du kiosque avant les téléchargements
+- Classe 'realtime' (flux vidéo, /capture, photo et clip affichés par la borne
+  qui les a pris) : jamais limitée, seulement comptée ; pendant une capture les
+  classes limitées passent en mode réduit
+- Classes limitées ('gallery', 'bulk') : nombre de transferts simultanés borné
+  et débit agrégé plafonné par un seau à jetons
+- Santé caméra : le flux signale chaque frame ; si le fps mesuré passe sous
+  la cible, les classes limitées rétrécissent (concurrence et débit) jusqu'au
+  retour à la normale
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Seuils (fraction du fps cible) avec hystérésis pour éviter les oscillations
+DEGRADE_BELOW = 0.85
+RECOVER_ABOVE = 0.95
+# Lissage exponentiel de l'intervalle entre frames
+FPS_SMOOTHING = 0.1
+# Sans frame depuis ce délai, le flux est considéré arrêté (aucune pression)
+STREAM_IDLE_SECONDS = 2.0
+
+
+class TokenBucket:
+    """Débit agrégé (octets/s) partagé par tous les transferts d'une classe
+
+    Horloge virtuelle : chaque envoi réserve len/rate secondes à la suite des
+    précédents ; burst_seconds de débit peuvent partir sans attente.
+    """
+
+    def __init__(self, rate, burst_seconds=0.25):
+        self.rate = rate
+        self.burst_seconds = burst_seconds
+        self._clock = 0.0
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate):
+        with self._lock:
+            self.rate = rate
+
+    def consume(self, amount):
+        """Attendre le droit d'envoyer amount octets"""
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(self._clock, now - self.burst_seconds)
+            self._clock = start + amount / self.rate
+            delay = self._clock - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class TrafficClass:
+    """Transferts d'une même priorité : créneaux simultanés et seau à jetons"""
+
+    def __init__(self, name, concurrency=None, rate=None, degraded_concurrency=1, degraded_rate=None):
+        self.name = name
+        self.concurrency = concurrency
+        self.rate = rate
+        self.degraded_concurrency = degraded_concurrency
+        self.degraded_rate = degraded_rate
+        self.active = 0
+        self.rejected = 0
+        self.degraded = False
+        self.bucket = TokenBucket(rate)
+        self._condition = threading.Condition()
+
+    @property
+    def limited(self):
+        return self.concurrency is not None or self.rate is not None
+
+    def current_concurrency(self):
+        if self.degraded and self.concurrency is not None:
+            return min(self.concurrency, self.degraded_concurrency)
+        return self.concurrency
+
+    def current_rate(self):
+        if self.degraded and self.degraded_rate is not None:
+            return self.degraded_rate
+        return self.rate
+
+    def set_degraded(self, degraded):
+        with self._condition:
+            self.degraded = degraded
+            self.bucket.set_rate(self.current_rate())
+            self._condition.notify_all()
+
+    def acquire(self, timeout):
+        """Prendre un créneau, False si aucun ne se libère avant timeout secondes"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                limit = self.current_concurrency()
+                if limit is None or self.active < limit:
+                    self.active += 1
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.rejected += 1
+                    return False
+                self._condition.wait(remaining)
+
+    def release(self):
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+    def throttle(self, chunks):
+        """Itérer sur chunks au débit de la classe"""
+        for chunk in chunks:
+            self.bucket.consume(len(chunk))
+            yield chunk
+
+    def snapshot(self):
+        return {
+            'name': self.name,
+            'active': self.active,
+            'concurrency': self.current_concurrency(),
+            'rate_kbps': round(self.current_rate() / 1024) if self.current_rate() else None,
+            'degraded': self.degraded,
+            'rejected': self.rejected,
+        }
+
+
+class QosScheduler:
+    """Classes de trafic pilotées par la santé du flux caméra"""
+
+    def __init__(self, target_fps):
+        self.target_fps = target_fps
+        self.classes = {'realtime': TrafficClass('realtime')}
+        self.degraded = False
+        self._priority_ops = 0
+        self._frame_interval = None
+        self._last_frame = None
+        self._lock = threading.Lock()
+        self._state_lock = threading.Lock()
+
+    def add_class(self, name, **limits):
+        self.classes[name] = TrafficClass(name, **limits)
+        return self.classes[name]
+
+    def record_frame(self, now=None):
+        """Appelé par le flux vidéo à chaque frame envoyée"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self._last_frame is not None:
+                interval = now - self._last_frame
+                if self._frame_interval is None or interval > STREAM_IDLE_SECONDS:
+                    self._frame_interval = min(interval, 1.0 / self.target_fps)
+                else:
+                    self._frame_interval += FPS_SMOOTHING * (interval - self._frame_interval)
+            self._last_frame = now
+        self._update(now)
+
+    def measured_fps(self, now=None):
+        """Fps lissé du flux, None si aucun flux actif"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self._last_frame is None or self._frame_interval is None:
+                return None
+            if now - self._last_frame > STREAM_IDLE_SECONDS:
+                return None
+            return 1.0 / max(self._frame_interval, now - self._last_frame, 1e-6)
+
+    @contextmanager
+    def priority(self):
+        """Opération temps réel (capture) : transferts limités réduits pendant sa durée"""
+        with self._lock:
+            self._priority_ops += 1
+        self.classes['realtime'].acquire(0)
+        self._update()
+        try:
+            yield
+        finally:
+            self.classes['realtime'].release()
+            with self._lock:
+                self._priority_ops -= 1
+            self._update()
+
+    def _update(self, now=None):
+        fps = self.measured_fps(now)
+        with self._state_lock:
+            if self._priority_ops:
+                degraded = True
+            elif fps is None:
+                degraded = False
+            elif self.degraded:
+                degraded = fps < self.target_fps * RECOVER_ABOVE
+            else:
+                degraded = fps < self.target_fps * DEGRADE_BELOW
+            if degraded == self.degraded:
+                return degraded
+            self.degraded = degraded
+            if self._priority_ops:
+                logger.info("[QOS] Capture en cours : transferts limités réduits")
+            elif degraded:
+                logger.info(f"[QOS] Flux caméra à {fps:.1f}/{self.target_fps} fps : transferts limités réduits")
+            else:
+                logger.info("[QOS] Flux caméra rétabli : limites normales")
+            for traffic_class in self.classes.values():
+                if traffic_class.limited:
+                    traffic_class.set_degraded(degraded)
+        return degraded
+
+    def acquire(self, name, timeout):
+        """Entrer dans une classe (l'état du flux est réévalué à chaque admission)"""
+        self._update()
+        return self.classes[name].acquire(timeout)
+
+    def release(self, name):
+        self.classes[name].release()
+
+    def snapshot(self):
+        return {
+            'target_fps': self.target_fps,
+            'measured_fps': round(self.measured_fps() or 0, 1),
+            'degraded': self.degraded,
+            'classes': [traffic_class.snapshot() for traffic_class in self.classes.values()],
+        }